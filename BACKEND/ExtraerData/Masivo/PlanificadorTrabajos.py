@@ -0,0 +1,183 @@
+import heapq, itertools, threading, time
+from typing import Dict, List, Optional
+from .ProcesadorMasivo import MassiveProcessor, ProcesamientoCancelado
+from ..Normal.configuracion import MAX_CONCURRENT_JOBS, JOB_RESULT_TTL, DRY_RUN_SAMPLE_SIZE, logger, trabajo_actual
+
+# Estados de un trabajo que todavía no ha terminado
+ESTADOS_ACTIVOS = ('queued', 'processing')
+
+
+class DuplicateJobError(ValueError):
+    # Se lanza al registrar un process_id que ya pertenece a un trabajo conocido (activo o con resultado sin expirar)
+    pass
+
+
+class JobScheduler:
+
+    def __init__(self, max_workers: int = MAX_CONCURRENT_JOBS, processor_factory=MassiveProcessor, result_ttl: float = JOB_RESULT_TTL):
+        # Inicializa el planificador con un número fijo de hilos trabajadores y una cola con prioridades
+        self.max_workers = max_workers
+        self.processor_factory = processor_factory
+        self.result_ttl = result_ttl
+        self._lock = threading.Condition()
+        self._queue: List[tuple] = []  # Montículo de (-prioridad, orden de llegada, trabajo)
+        self._counter = itertools.count()
+        self._jobs: Dict[str, dict] = {}
+        self._workers = []
+
+        for idx in range(max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"massive-worker-{idx}")
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, process_id: str, ruta: str, priority: int = 0, dry_run: bool = False,
+               sample_size: int = DRY_RUN_SAMPLE_SIZE, workers: int = 1) -> dict:
+        # Encola un procesamiento masivo; a mayor prioridad antes se ejecuta y, a igual prioridad, en orden FIFO
+        # Con dry_run=True el trabajo solo estima el costo (muestreando sample_size PDFs por elemento)
+        # Un process_id no se reutiliza mientras el trabajo siga registrado, aunque ya haya terminado:
+        # así nadie reemplaza un resultado antes de que su dueño lo consulte
+        with self._lock:
+            self._purge_expired()
+            if process_id in self._jobs:
+                raise DuplicateJobError(f"Ya existe un procesamiento con el ID {process_id}")
+
+            job = {
+                "process_id": process_id,
+                "ruta": ruta,
+                "priority": priority,
+                "dry_run": dry_run,
+                "sample_size": sample_size,
+                "workers": workers,
+                "cancel_event": threading.Event(),
+                "status": {"status": "queued", "progress": 0, "message": "En cola de procesamiento...", "result": None, "error": None},
+                "finished_at": None,
+            }
+            self._jobs[process_id] = job
+            heapq.heappush(self._queue, (-priority, next(self._counter), job))
+            self._lock.notify()
+
+            logger.info("Procesamiento masivo %s encolado con prioridad %s", process_id, priority)
+            return self._snapshot(job)
+
+    def get_status(self, process_id: str) -> Optional[dict]:
+        # Devuelve una copia del estado del trabajo, incluida su posición en la cola si aún espera
+        with self._lock:
+            self._purge_expired()
+            job = self._jobs.get(process_id)
+            return self._snapshot(job) if job else None
+
+    def cancel(self, process_id: str) -> Optional[dict]:
+        # Cancela un trabajo: si está en cola se descarta de inmediato; si está en curso se detiene
+        # entre documentos. Devuelve None si el ID no existe
+        with self._lock:
+            self._purge_expired()
+            job = self._jobs.get(process_id)
+            if not job:
+                return None
+
+            estado = job["status"]["status"]
+            if estado == "queued":
+                # La entrada del montículo se descarta cuando un trabajador la extraiga
+                job["status"].update({"status": "cancelled", "message": "Procesamiento cancelado", "progress": 0})
+                job["finished_at"] = time.monotonic()
+                logger.info("Procesamiento masivo %s cancelado antes de iniciar", process_id)
+            elif estado == "processing":
+                job["cancel_event"].set()
+                job["status"]["message"] = "Cancelando procesamiento..."
+                logger.info("Cancelación solicitada para el procesamiento masivo %s", process_id)
+
+            return self._snapshot(job)
+
+    def _purge_expired(self):
+        # Olvida los trabajos terminados hace más de result_ttl segundos; debe llamarse con el candado adquirido
+        limite = time.monotonic() - self.result_ttl
+        for process_id, job in list(self._jobs.items()):
+            if job["finished_at"] is not None and job["finished_at"] < limite:
+                del self._jobs[process_id]
+
+    def _snapshot(self, job: dict) -> dict:
+        # Copia el estado público de un trabajo; debe llamarse con el candado adquirido
+        status = dict(job["status"])
+        status["priority"] = job["priority"]
+        status["dry_run"] = job["dry_run"]
+        status["queue_position"] = self._queue_position(job) if status["status"] == "queued" else None
+        return status
+
+    def _queue_position(self, job: dict) -> int:
+        # Posición (desde 1) del trabajo entre los que siguen esperando en la cola
+        pendientes = sorted(entry for entry in self._queue if entry[2]["status"]["status"] == "queued")
+        for position, entry in enumerate(pendientes, 1):
+            if entry[2] is job:
+                return position
+        return 0
+
+    def _worker_loop(self):
+        # Bucle de cada hilo trabajador: toma el siguiente trabajo en cola y lo ejecuta
+        while True:
+            with self._lock:
+                job = None
+                while job is None:
+                    while not self._queue:
+                        self._lock.wait()
+                    _, _, candidate = heapq.heappop(self._queue)
+                    # Ignora entradas de trabajos cancelados mientras esperaban en la cola
+                    if candidate["status"]["status"] == "queued":
+                        job = candidate
+                job["status"].update({"status": "processing", "message": "Iniciando procesamiento..."})
+
+            self._run_job(job)
+
+    def _update_status(self, job: dict, **fields):
+        # Actualiza el estado de un trabajo de forma segura entre hilos
+        with self._lock:
+            job["status"].update(fields)
+            if job["status"]["status"] not in ESTADOS_ACTIVOS and job["finished_at"] is None:
+                job["finished_at"] = time.monotonic()
+
+    def _run_job(self, job: dict):
+        # Ejecuta el procesamiento masivo de un trabajo y registra su resultado final
+        process_id = job["process_id"]
+        # Todos los registros emitidos por este hilo durante el trabajo llevan su ID
+        token = trabajo_actual.set(process_id)
+        inicio = time.perf_counter()
+        try:
+            processor = self.processor_factory()
+
+            # Callbacks para actualizar el progreso y estado durante el procesamiento
+            def progress_callback(progress):
+                self._update_status(job, progress=progress)
+
+            def status_callback(message):
+                self._update_status(job, message=message)
+
+            if job["dry_run"]:
+                # Simulación: devuelve la estimación de costo sin generar Excel ni ZIP
+                estimacion = processor.estimate_massive(job["ruta"], job["sample_size"], job["workers"], progress_callback, status_callback, job["cancel_event"])
+                self._update_status(job, status="completed", progress=100, message="Estimación completada", result={"dry_run": True, "estimacion": estimacion}, error=None)
+                return
+
+            # Ejecuta el procesamiento masivo principal
+            zip_path = processor.process_massive(job["ruta"], progress_callback, status_callback, job["cancel_event"])
+
+            # Actualiza el estado final según el resultado del procesamiento
+            if zip_path:
+                self._update_status(job, status="completed", progress=100, message="Procesamiento masivo completado exitosamente",
+                    result={
+                        "zip_path": zip_path,
+                        "message": "Todos los archivos han sido procesados y comprimidos",
+                        "archivos_descartados": processor.triage.resumen()
+                    },
+                    error=None
+                )
+            else:
+                self._update_status(job, status="error", progress=0, message="No se generaron resultados", result=None, error="No se encontraron archivos para procesar o ocurrió un error")
+
+        except ProcesamientoCancelado:
+            self._update_status(job, status="cancelled", message="Procesamiento cancelado", result=None, error=None)
+        except Exception as e:
+            logger.error("Error en procesamiento masivo %s: %s", process_id, e)
+            self._update_status(job, status="error", progress=0, message="Error durante el procesamiento", result=None, error=str(e))
+        finally:
+            logger.info("Procesamiento masivo %s finalizado", process_id, extra={"stage": "trabajo", "duration_ms": round((time.perf_counter() - inicio) * 1000)})
+            trabajo_actual.reset(token)
@@ -1,28 +1,47 @@
-import os, zipfile
+import os, tempfile, time, zipfile
+from collections import Counter
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from tkinter import messagebox
 from ..Normal.extractor import DocumentExtractor
+from ..Normal.modelos import DocumentoData
 from ..Normal.archivos import FileProcessor
 from ..Normal.excel import ExcelExporter
-from ..Normal.configuracion import logger
+from ..Normal.almacen import DocumentStore
+from ..Normal.prefiltro import PdfTriage
+from ..Normal.espacio import JobWorkspace
+from ..Normal.configuracion import logger, trabajo_actual, DRY_RUN_SAMPLE_SIZE, DRY_RUN_SLOWEST_ITEMS, DRY_RUN_EXCEL_ROWS
+
+# Prefijo del ZIP de resultados que se publica en la carpeta principal
+PREFIJO_ZIP_RESULTADOS = "excel_con_resultados"
+
+class ProcesamientoCancelado(Exception):
+    # Se lanza cuando un procesamiento masivo se cancela entre documentos
+    pass
 
 class MassiveProcessor:
     
-    def __init__(self):
+    def __init__(self, document_store: Optional[DocumentStore] = None):
         # Inicializa los componentes principales: extractor de documentos, procesador de archivos y exportador a Excel
+        # Si se recibe un almacén, los documentos extraídos de cada elemento se guardan también en él
+        self.document_store = document_store
         self.extractor = DocumentExtractor()
         self.file_processor = FileProcessor()
         self.excel_exporter = ExcelExporter()
+        self.triage = PdfTriage()
         self.processing = False
         self.current_progress = 0
         self.total_items = 0
+        self.cancel_event = None
         
-    def process_massive(self, main_folder_path: str, progress_callback=None, status_callback=None) -> str:
+    def process_massive(self, main_folder_path: str, progress_callback=None, status_callback=None, cancel_event=None) -> str:
         # Función principal que coordina el procesamiento masivo de carpetas y archivos ZIP
+        # Si se recibe cancel_event, el procesamiento se detiene entre documentos cuando se activa
+        workspace = None
         try:
             self.processing = True
             self.current_progress = 0
+            self.cancel_event = cancel_event
             
             if status_callback:
                 status_callback("Buscando subcarpetas y archivos comprimidos...")
@@ -36,39 +55,42 @@ class MassiveProcessor:
                     status_callback("No se encontraron subcarpetas ni archivos ZIP para procesar.")
                 return ""
             
-            # Crea directorio temporal para almacenar resultados intermedios
-            temp_results_dir = Path.home() / "Downloads" / "resultados_temporales"
-            temp_results_dir.mkdir(exist_ok=True)
+            # Crea un espacio de trabajo exclusivo para los temporales y resultados intermedios de este trabajo
+            workspace = JobWorkspace(trabajo_actual.get() or "masivo")
+            self.file_processor = FileProcessor(workspace.temp_root)
+            temp_results_dir = Path(workspace.output_dir)
             
             excel_files = []
             
             # Procesa cada elemento encontrado (carpeta o ZIP)
             for idx, (item_path, item_name, is_zip) in enumerate(items_to_process, 1):
+                self.check_cancelled()
                 if status_callback:
                     status_callback(f"Procesando: {item_name}")
                 
                 try:
                     # Procesa un elemento individual y guarda el archivo resultante
+                    inicio = time.perf_counter()
                     result_file = self.process_single_item(item_path, item_name, is_zip, temp_results_dir)
                     if result_file:
                         excel_files.append(result_file)
+                    logger.info("Elemento procesado: %s", item_name, extra={"file": item_name, "stage": "elemento", "duration_ms": round((time.perf_counter() - inicio) * 1000)})
                     
                     # Actualiza la barra de progreso
                     self.current_progress = (idx / self.total_items) * 100
                     if progress_callback:
                         progress_callback(self.current_progress)
                         
+                except ProcesamientoCancelado:
+                    raise
                 except Exception as e:
-                    logger.error(f"Error procesando {item_name}: {e}")
+                    logger.error("Error procesando %s: %s", item_name, e, extra={"file": item_name, "stage": "elemento"})
                     if status_callback:
                         status_callback(f"Error en {item_name}: {str(e)}")
             
             # Crea archivo ZIP final con todos los Excel generados
             if excel_files:
-                zip_path = self.create_results_zip(excel_files, main_folder_path)
-                
-                # Limpia los archivos temporales creados durante el procesamiento
-                self.cleanup_temp_files(temp_results_dir)
+                zip_path = self.create_results_zip(excel_files, main_folder_path, workspace)
                 
                 if status_callback:
                     status_callback("Procesamiento masivo completado exitosamente.")
@@ -79,13 +101,214 @@ class MassiveProcessor:
                     status_callback("No se generaron archivos Excel.")
                 return ""
                 
+        except ProcesamientoCancelado:
+            # Descarta los resultados parciales y propaga la cancelación a quien lanzó el proceso
+            logger.info("Procesamiento masivo cancelado: %s", main_folder_path)
+            if status_callback:
+                status_callback("Procesamiento cancelado.")
+            raise
         except Exception as e:
-            logger.error(f"Error en procesamiento masivo: {e}")
+            logger.error("Error en procesamiento masivo: %s", e)
             if status_callback:
                 status_callback(f"Error: {str(e)}")
             return ""
         finally:
+            # Elimina el espacio de trabajo con todos los temporales del trabajo, termine como termine
+            if workspace:
+                workspace.cleanup()
+            self.processing = False
+            self.cancel_event = None
+    
+    def estimate_massive(self, main_folder_path: str, sample_size: int = DRY_RUN_SAMPLE_SIZE, workers: int = 1,
+                         progress_callback=None, status_callback=None, cancel_event=None) -> Dict:
+        # Simulación del procesamiento masivo: enumera los elementos, pasa una muestra de PDFs de cada uno
+        # por la extracción real y proyecta documentos, bytes, tipos y tiempo total sin publicar resultados
+        workspace = None
+        try:
+            self.processing = True
+            self.current_progress = 0
+            self.cancel_event = cancel_event
+            
+            if status_callback:
+                status_callback("Buscando subcarpetas y archivos comprimidos...")
+            
+            items_to_process = self.find_processing_items(main_folder_path)
+            self.total_items = len(items_to_process)
+            
+            # Los PDFs muestreados de los ZIP y los Excel de medición se generan en un espacio de trabajo propio
+            workspace = JobWorkspace(trabajo_actual.get() or "estimacion")
+            self.file_processor = FileProcessor(workspace.temp_root)
+            costo_excel = self.measure_excel_cost(workspace) if items_to_process else (0.0, 0.0)
+            # La importación diferida de pdfplumber no debe contarse en el primer PDF muestreado y proyectarse
+            import pdfplumber  # noqa: F401
+            
+            estimaciones = []
+            for idx, (item_path, item_name, is_zip) in enumerate(items_to_process, 1):
+                self.check_cancelled()
+                if status_callback:
+                    status_callback(f"Muestreando: {item_name}")
+                
+                try:
+                    estimaciones.append(self.estimate_single_item(item_path, item_name, is_zip, sample_size, workspace, costo_excel))
+                except ProcesamientoCancelado:
+                    raise
+                except Exception as e:
+                    logger.error("Error muestreando %s: %s", item_name, e, extra={"file": item_name, "stage": "estimacion"})
+                
+                self.current_progress = (idx / self.total_items) * 100
+                if progress_callback:
+                    progress_callback(self.current_progress)
+            
+            if status_callback:
+                status_callback("Estimación completada.")
+            
+            return self.summarize_estimate(estimaciones, workers)
+            
+        finally:
+            if workspace:
+                workspace.cleanup()
             self.processing = False
+            self.cancel_event = None
+    
+    def estimate_single_item(self, item_path: str, item_name: str, is_zip: bool, sample_size: int, workspace: JobWorkspace,
+                             costo_excel: Tuple[float, float] = (0.0, 0.0)) -> Dict:
+        # Cuenta los PDFs y bytes de un elemento y mide sobre una muestra cada etapa del procesamiento real:
+        # descompresión del ZIP, prefiltro y texto, extracción de campos y exportación a Excel
+        etapas = {"zip": 0.0, "texto": 0.0, "campos": 0.0, "excel": 0.0}
+        if is_zip:
+            # Del ZIP solo se extraen los PDFs de la muestra; el índice da los tamaños de todos los miembros
+            with zipfile.ZipFile(item_path, 'r') as zip_ref:
+                todos = [m for m in zip_ref.infolist() if not m.is_dir()]
+                miembros = [m for m in todos if m.filename.lower().endswith('.pdf')]
+                tamanos = [m.file_size for m in miembros]
+                destino = tempfile.mkdtemp(prefix="muestra_", dir=workspace.temp_root)
+                seleccion = self.choose_sample(miembros, sample_size)
+                inicio = time.perf_counter()
+                muestra = [zip_ref.extract(m, destino) for m in seleccion]
+                segundos_descompresion = time.perf_counter() - inicio
+            # process_single_item extrae el ZIP completo: se proyecta el tiempo medido por byte leído
+            # y escrito (comprimido + descomprimido) de la muestra sobre todos los miembros del índice
+            bytes_muestra = sum(m.compress_size + m.file_size for m in seleccion)
+            if bytes_muestra:
+                etapas["zip"] = segundos_descompresion / bytes_muestra * sum(m.compress_size + m.file_size for m in todos)
+        else:
+            pdf_files = self.file_processor.find_pdf_files(item_path)
+            tamanos = [os.path.getsize(pdf) for pdf in pdf_files]
+            muestra = self.choose_sample(pdf_files, sample_size)
+        
+        total = len(tamanos)
+        factor = total / len(muestra) if muestra else 0
+        
+        # Cada PDF de la muestra recorre el mismo camino que en process_single_item
+        tipos = Counter()
+        documentos = 0
+        for pdf_path in muestra:
+            self.check_cancelled()
+            inicio = time.perf_counter()
+            try:
+                text = self.triage.extract_candidate_text(pdf_path, self.extractor)
+            except Exception as e:
+                logger.error("Error procesando %s: %s", os.path.basename(pdf_path), e, extra={"file": os.path.basename(pdf_path), "stage": "estimacion"})
+                text = None
+                tipos['ERROR'] += 1
+            else:
+                if text is None:
+                    tipos['DESCARTADO'] += 1
+            etapas["texto"] += time.perf_counter() - inicio
+            if text is None:
+                continue
+            
+            inicio = time.perf_counter()
+            document_data = self.extractor.extract_document_data(text, os.path.basename(pdf_path))
+            etapas["campos"] += time.perf_counter() - inicio
+            if document_data:
+                documentos += 1
+                tipos[document_data.tipo_documento] += 1
+            else:
+                tipos['SIN_DATOS'] += 1
+        
+        # Texto y campos se miden por documento, así que escalan linealmente con el total del elemento
+        etapas["texto"] *= factor
+        etapas["campos"] *= factor
+        
+        # Un Excel por elemento: costo fijo del libro más un costo por fila, medidos una vez por trabajo
+        filas = round(documentos * factor)
+        if filas:
+            fijo, por_fila = costo_excel
+            etapas["excel"] = fijo + por_fila * filas
+        
+        return {
+            "elemento": item_name,
+            "documentos": total,
+            "bytes": sum(tamanos),
+            "muestreados": len(muestra),
+            "segundos_estimados": sum(etapas.values()),
+            "etapas": etapas,
+            "tipos": {tipo: cantidad * factor for tipo, cantidad in tipos.items()},
+        }
+    
+    def measure_excel_cost(self, workspace: JobWorkspace, filas: int = DRY_RUN_EXCEL_ROWS) -> Tuple[float, float]:
+        # Mide la exportación de un libro de 1 fila y otro de `filas` filas con un documento ficticio
+        # y devuelve (costo fijo por libro, costo por fila) en segundos
+        documento = DocumentoData(tipo_documento='CC', numero_documento='1000000000', nombres_apellidos='NOMBRE DE PRUEBA',
+                                  dia='1', mes='Enero', año='2000', fecha_vigencia=None, dias_restantes="N/A",
+                                  estado='EXTRAÍDO', archivo_origen='muestra.pdf')
+        destino = tempfile.mkdtemp(prefix="excel_", dir=workspace.temp_root)
+        tiempos = []
+        for cantidad in (1, filas):
+            inicio = time.perf_counter()
+            self.excel_exporter.export_to_excel_massive([documento] * cantidad, f"medicion_{cantidad}", destino)
+            tiempos.append(time.perf_counter() - inicio)
+        por_fila = max(0.0, (tiempos[1] - tiempos[0]) / max(1, filas - 1))
+        return tiempos[0], por_fila
+    
+    def choose_sample(self, elementos: list, sample_size: int) -> list:
+        # Elige hasta sample_size elementos repartidos de forma uniforme a lo largo de la lista
+        if len(elementos) <= sample_size:
+            return list(elementos)
+        paso = len(elementos) / sample_size
+        return [elementos[int(i * paso)] for i in range(sample_size)]
+    
+    def summarize_estimate(self, estimaciones: List[Dict], workers: int) -> Dict:
+        # Agrega las estimaciones por elemento en la proyección total del trabajo
+        tipos = Counter()
+        etapas = Counter()
+        for estimacion in estimaciones:
+            tipos.update(estimacion["tipos"])
+            etapas.update(estimacion["etapas"])
+        
+        # process_massive recorre los elementos uno tras otro, así que el tiempo esperado es la suma
+        segundos_secuencial = sum(e["segundos_estimados"] for e in estimaciones)
+        mas_lentos = sorted(estimaciones, key=lambda e: e["segundos_estimados"], reverse=True)[:DRY_RUN_SLOWEST_ITEMS]
+        
+        resumen = {
+            "elementos": len(estimaciones),
+            "documentos_totales": sum(e["documentos"] for e in estimaciones),
+            "bytes_totales": sum(e["bytes"] for e in estimaciones),
+            "documentos_muestreados": sum(e["muestreados"] for e in estimaciones),
+            "tipos_estimados": {tipo: round(cantidad) for tipo, cantidad in tipos.most_common()},
+            "segundos_estimados": round(segundos_secuencial, 1),
+            "segundos_por_etapa": {etapa: round(segundos, 1) for etapa, segundos in etapas.items()},
+            "elementos_mas_lentos": [
+                {"elemento": e["elemento"], "documentos": e["documentos"], "segundos_estimados": round(e["segundos_estimados"], 1)}
+                for e in mas_lentos
+            ],
+            "archivos_descartados": self.triage.resumen(),
+        }
+        
+        # Proyección hipotética: el procesamiento actual no reparte los elementos de un trabajo entre hilos.
+        # Con N trabajadores por elementos el total no bajaría del elemento más lento
+        if workers > 1:
+            resumen["hipotetico_paralelo"] = {
+                "workers": workers,
+                "segundos_estimados": round(max(segundos_secuencial / workers, mas_lentos[0]["segundos_estimados"] if mas_lentos else 0), 1),
+            }
+        return resumen
+    
+    def check_cancelled(self):
+        # Interrumpe el procesamiento si se solicitó su cancelación
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ProcesamientoCancelado()
     
     def find_processing_items(self, main_folder_path: str) -> List[tuple]:
         # Busca y retorna todas las subcarpetas y archivos ZIP dentro del directorio principal
@@ -100,7 +323,8 @@ class MassiveProcessor:
         # Busca archivos ZIP en el directorio principal
         for item in os.listdir(main_folder_path):
             item_path = os.path.join(main_folder_path, item)
-            if os.path.isfile(item_path) and item.lower().endswith('.zip'):
+            # Los ZIP de resultados de ejecuciones anteriores no son elementos a procesar
+            if os.path.isfile(item_path) and item.lower().endswith('.zip') and not item.startswith(PREFIJO_ZIP_RESULTADOS):
                 items.append((item_path, item, True))
         
         return items
@@ -118,23 +342,27 @@ class MassiveProcessor:
             pdf_files = self.file_processor.find_pdf_files(work_folder)
             
             if not pdf_files:
-                logger.warning(f"No se encontraron PDFs en: {item_name}")
+                logger.warning("No se encontraron PDFs en: %s", item_name, extra={"file": item_name, "stage": "busqueda_pdf"})
                 return ""
             
             # Extrae datos de cada PDF encontrado
             extracted_data = []
             for pdf_path in pdf_files:
+                self.check_cancelled()
+                # Descarta los PDFs que no parecen certificados antes de la extracción completa
                 pdf_filename = os.path.basename(pdf_path)
                 try:
-                    text = self.extractor.extract_text_from_pdf(pdf_path)
+                    text = self.triage.extract_candidate_text(pdf_path, self.extractor)
+                    if text is None:
+                        continue
                     document_data = self.extractor.extract_document_data(text, pdf_filename)
                     if document_data:
                         extracted_data.append(document_data)
                 except Exception as e:
-                    logger.error(f"Error procesando {pdf_filename}: {e}")
+                    logger.error("Error procesando %s: %s", pdf_filename, e, extra={"file": pdf_filename, "stage": "extraccion_texto"})
             
             if not extracted_data:
-                logger.warning(f"No se extrajeron datos válidos de: {item_name}")
+                logger.warning("No se extrajeron datos válidos de: %s", item_name, extra={"file": item_name, "stage": "extraccion_campos"})
                 return ""
             
             # Limpia el nombre del elemento para usarlo como nombre de archivo
@@ -143,6 +371,13 @@ class MassiveProcessor:
             else:
                 clean_item_name = self.clean_filename(item_name)
             
+            # Registra los documentos en el almacén usando el nombre del elemento como ficha
+            if self.document_store:
+                try:
+                    self.document_store.save_documents(extracted_data, clean_item_name, item_path)
+                except Exception as e:
+                    logger.error("Error guardando documentos de %s en el almacén: %s", item_name, e, extra={"file": item_name, "stage": "almacen"})
+            
             # Exporta los datos extraídos a un archivo Excel
             excel_path = self.excel_exporter.export_to_excel_massive(
                 extracted_data, clean_item_name, output_dir
@@ -155,29 +390,23 @@ class MassiveProcessor:
             if is_zip:
                 self.file_processor.cleanup_temp_files()
     
-    def create_results_zip(self, excel_files: List[str], main_folder_path: str) -> str:
-        # Crea un archivo ZIP que contiene todos los archivos Excel generados
-        zip_path = os.path.join(main_folder_path, "excel_con_resultados.zip")
+    def create_results_zip(self, excel_files: List[str], main_folder_path: str, workspace: JobWorkspace) -> str:
+        # Crea un archivo ZIP con todos los Excel generados dentro del espacio de trabajo
+        # y lo publica de forma atómica en la carpeta principal con el ID del trabajo en el nombre,
+        # para que dos trabajos sobre la misma carpeta no se sobrescriban el resultado
+        zip_name = f"{PREFIJO_ZIP_RESULTADOS}_{workspace.id}.zip"
+        zip_path = os.path.join(main_folder_path, zip_name)
+        staging_path = workspace.staging_path(zip_name)
         
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        with zipfile.ZipFile(staging_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
             for excel_file in excel_files:
                 zipf.write(excel_file, os.path.basename(excel_file))
         
-        logger.info(f"ZIP creado exitosamente: {zip_path}")
+        workspace.publish(staging_path, zip_path)
+        
+        logger.info("ZIP creado exitosamente: %s", zip_path)
         return zip_path
     
-    def cleanup_temp_files(self, temp_dir: Path):
-        # Elimina todos los archivos temporales y el directorio temporal
-        try:
-            for file in temp_dir.glob("*"):
-                file.unlink()
-            temp_dir.rmdir()
-        except Exception as e:
-            logger.error(f"Error limpiando archivos temporales: {e}")
-    
     def clean_filename(self, filename: str) -> str:
-        # Limpia el nombre de archivo removiendo caracteres inválidos y limitando su longitud
-        invalid_chars = '<>:"/\\|?*'
-        for char in invalid_chars:
-            filename = filename.replace(char, '_')
-        return filename[:50]  # Limita la longitud del nombre
\ No newline at end of file
+        # Limpia el nombre de archivo con la misma regla que los Excel individuales
+        return self.excel_exporter.clean_filename(filename)
\ No newline at end of file
@@ -0,0 +1,123 @@
+import json, re, sqlite3, threading
+from contextlib import closing
+from datetime import datetime
+from typing import List, Dict, Optional
+from .modelos import DocumentoData
+from .configuracion import DB_FILE, DB_BATCH_SIZE, DB_QUERY_LIMIT, logger, trabajo_actual
+
+# Esquema del almacén: un registro por documento extraído y por ficha/archivo de origen
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS documentos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tipo_documento TEXT NOT NULL,
+    numero_documento TEXT NOT NULL,
+    nombres_apellidos TEXT COLLATE NOCASE,
+    dia TEXT,
+    mes TEXT,
+    anio TEXT,
+    fecha_vigencia TEXT,
+    estado TEXT,
+    archivo_origen TEXT NOT NULL,
+    ficha TEXT NOT NULL,
+    fuente TEXT,
+    job_id TEXT,
+    procesado_en TEXT NOT NULL,
+    UNIQUE (tipo_documento, numero_documento, ficha, archivo_origen)
+);
+CREATE INDEX IF NOT EXISTS idx_documentos_numero ON documentos (numero_documento);
+CREATE INDEX IF NOT EXISTS idx_documentos_tipo ON documentos (tipo_documento);
+CREATE INDEX IF NOT EXISTS idx_documentos_ficha ON documentos (ficha, archivo_origen);
+CREATE INDEX IF NOT EXISTS idx_documentos_nombres ON documentos (nombres_apellidos COLLATE NOCASE);
+"""
+
+COLUMNAS_CONSULTA = "tipo_documento, numero_documento, nombres_apellidos, dia, mes, anio, fecha_vigencia, estado, archivo_origen, ficha, fuente, job_id, procesado_en"
+
+
+class DocumentStore:
+
+    def __init__(self, db_path: str = DB_FILE, batch_size: int = DB_BATCH_SIZE):
+        # Inicializa el almacén y crea la tabla e índices si aún no existen
+        self.db_path = db_path
+        self.batch_size = batch_size
+        # SQLite admite un solo escritor a la vez; el candado evita esperas por bloqueo entre hilos
+        self._write_lock = threading.Lock()
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(ESQUEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Abre una conexión por operación para poder usar el almacén desde varios hilos
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def save_documents(self, documentos: List[DocumentoData], ficha: str, fuente: Optional[str] = None, job_id: Optional[str] = None) -> int:
+        # Guarda los documentos en lotes dentro de una sola transacción; si un documento ya existía
+        # para la misma ficha y archivo se reemplaza, de modo que reprocesar no genera duplicados
+        if not documentos:
+            return 0
+
+        procesado_en = datetime.now().isoformat(timespec='seconds')
+        job_id = job_id or trabajo_actual.get()
+        registros = [
+            (doc.tipo_documento, doc.numero_documento, doc.nombres_apellidos, doc.dia, doc.mes, doc.año,
+             doc.fecha_vigencia.isoformat() if doc.fecha_vigencia else None, doc.estado, doc.archivo_origen,
+             ficha, fuente, job_id, procesado_en)
+            for doc in documentos
+        ]
+
+        with self._write_lock, closing(self._connect()) as conn:
+            with conn:
+                for inicio in range(0, len(registros), self.batch_size):
+                    conn.executemany(
+                        f"INSERT OR REPLACE INTO documentos ({COLUMNAS_CONSULTA}) VALUES ({', '.join('?' * 13)})",
+                        registros[inicio:inicio + self.batch_size]
+                    )
+
+        logger.info("Guardados %s documentos de la ficha %s en el almacén", len(registros), ficha, extra={"stage": "almacen"})
+        return len(registros)
+
+    def find_by_number(self, numero_documento: str, tipo_documento: Optional[str] = None) -> List[Dict]:
+        # Busca un número de documento exacto e indica en qué fichas y archivos aparece
+        numero_documento = numero_documento.replace('.', '').strip()
+        if tipo_documento:
+            return self._query(f"SELECT {COLUMNAS_CONSULTA} FROM documentos WHERE numero_documento = ? AND tipo_documento = ? ORDER BY procesado_en DESC",
+                               (numero_documento, tipo_documento.upper()))
+        return self._query(f"SELECT {COLUMNAS_CONSULTA} FROM documentos WHERE numero_documento = ? ORDER BY procesado_en DESC", (numero_documento,))
+
+    def search_by_prefix(self, prefijo: str, limit: int = DB_QUERY_LIMIT) -> List[Dict]:
+        # Busca documentos cuyo número empieza por el prefijo; GLOB aprovecha el índice de numero_documento
+        prefijo = re.sub(r'[^0-9A-Za-z]', '', prefijo)
+        if not prefijo:
+            return []
+        return self._query(f"SELECT {COLUMNAS_CONSULTA} FROM documentos WHERE numero_documento GLOB ? ORDER BY numero_documento LIMIT ?",
+                           (prefijo + '*', limit))
+
+    def search_by_name(self, nombre: str, contiene: bool = False, limit: int = DB_QUERY_LIMIT) -> List[Dict]:
+        # Busca por nombre sin distinguir mayúsculas. Por defecto busca por inicio del nombre (usa el índice);
+        # con contiene=True busca el texto en cualquier parte del nombre (recorre la tabla)
+        nombre = ' '.join(nombre.split())
+        if not nombre:
+            return []
+        escapado = nombre.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        patron = f"%{escapado}%" if contiene else f"{escapado}%"
+        return self._query(f"SELECT {COLUMNAS_CONSULTA} FROM documentos WHERE nombres_apellidos LIKE ? ESCAPE '\\' ORDER BY nombres_apellidos LIMIT ?",
+                           (patron, limit))
+
+    def find_duplicates(self, limit: int = DB_QUERY_LIMIT) -> List[Dict]:
+        # Lista los documentos que aparecen en más de una ficha; las fichas se agregan como arreglo JSON
+        # porque los nombres de carpeta pueden contener comas
+        filas = self._query(
+            "SELECT tipo_documento, numero_documento, COUNT(DISTINCT ficha) AS total_fichas, json_group_array(DISTINCT ficha) AS fichas "
+            "FROM documentos GROUP BY tipo_documento, numero_documento HAVING COUNT(DISTINCT ficha) > 1 "
+            "ORDER BY total_fichas DESC, numero_documento LIMIT ?",
+            (limit,)
+        )
+        for fila in filas:
+            fila["fichas"] = json.loads(fila["fichas"])
+        return filas
+
+    def _query(self, sql: str, params: tuple) -> List[Dict]:
+        # Ejecuta una consulta de lectura y devuelve las filas como diccionarios
+        with closing(self._connect()) as conn:
+            return [dict(fila) for fila in conn.execute(sql, params).fetchall()]
@@ -1,19 +1,23 @@
 import os, tempfile, shutil, zipfile
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 from .configuracion import RARFILE_AVAILABLE, logger
 
 class FileProcessor:
     
-    def __init__(self):
-        # Inicializa el procesador de archivos con un directorio temporal para extracciones
+    def __init__(self, base_dir: Optional[str] = None):
+        # Inicializa el procesador de archivos; las extracciones se crean dentro de base_dir
+        # (el espacio de trabajo del trabajo en curso) o en el directorio temporal del sistema
+        self.base_dir = base_dir
         self.temp_dir = None
+        self.temp_dirs: List[str] = []
     
     def extract_compressed_file(self, file_path: str) -> str:
         # Extrae archivos PDF de archivos comprimidos (ZIP o RAR) a un directorio temporal
         try:
-            # Crea un directorio temporal único para esta extracción
-            self.temp_dir = tempfile.mkdtemp(prefix="pdf_extractor_")
+            # Crea un directorio temporal único para esta extracción y lo registra para su limpieza
+            self.temp_dir = tempfile.mkdtemp(prefix="pdf_extractor_", dir=self.base_dir)
+            self.temp_dirs.append(self.temp_dir)
             file_extension = os.path.splitext(file_path)[1].lower()
             
             if file_extension == '.zip':
@@ -22,7 +26,7 @@ class FileProcessor:
                     pdf_files = [f for f in zip_ref.namelist() if f.lower().endswith('.pdf')]
                     for pdf_file in pdf_files:
                         zip_ref.extract(pdf_file, self.temp_dir)
-                    logger.info(f"Extraídos {len(pdf_files)} archivos PDF del ZIP")
+                    logger.info("Extraídos %s archivos PDF del ZIP", len(pdf_files))
                     
             elif file_extension == '.rar' and RARFILE_AVAILABLE:
                 # Extrae solo archivos PDF de archivos RAR (si la librería está disponible)
@@ -31,7 +35,7 @@ class FileProcessor:
                     pdf_files = [f for f in rar_ref.namelist() if f.lower().endswith('.pdf')]
                     for pdf_file in pdf_files:
                         rar_ref.extract(pdf_file, self.temp_dir)
-                    logger.info(f"Extraídos {len(pdf_files)} archivos PDF del RAR")
+                    logger.info("Extraídos %s archivos PDF del RAR", len(pdf_files))
                     
             else:
                 # Maneja formatos no soportados
@@ -41,21 +45,24 @@ class FileProcessor:
             
         except Exception as e:
             # Limpia el directorio temporal en caso de error y propaga la excepción
-            logger.error(f"Error extrayendo archivo comprimido: {e}")
+            logger.error("Error extrayendo archivo comprimido: %s", e, extra={"file": os.path.basename(file_path), "stage": "descompresion"})
             if self.temp_dir and os.path.exists(self.temp_dir):
                 shutil.rmtree(self.temp_dir)
+                self.temp_dirs.remove(self.temp_dir)
                 self.temp_dir = None
             raise
 
     def cleanup_temp_files(self):
-        # Elimina el directorio temporal y todos sus contenidos de forma segura
-        if self.temp_dir and os.path.exists(self.temp_dir):
+        # Elimina todos los directorios temporales creados por este procesador de forma segura
+        for temp_dir in list(self.temp_dirs):
             try:
-                shutil.rmtree(self.temp_dir)
-                self.temp_dir = None
+                if os.path.exists(temp_dir):
+                    shutil.rmtree(temp_dir)
+                self.temp_dirs.remove(temp_dir)
                 logger.info("Archivos temporales limpiados")
             except Exception as e:
-                logger.error(f"Error limpiando archivos temporales: {e}")
+                logger.error("Error limpiando archivos temporales: %s", e)
+        self.temp_dir = None
     
     def find_pdf_files(self, folder_path: str) -> List[str]:
         # Busca recursivamente todos los archivos PDF dentro de una carpeta y sus subcarpetas
@@ -1,14 +1,174 @@
-import logging, sys
+import atexit, contextvars, copy, json, logging, os, queue, sys, tempfile, threading, time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Parámetros del registro de eventos
+LOG_FILE = 'pdf_extractor.log'
+LOG_FILE_ENV = 'PDF_EXTRACTOR_LOG_FILE'  # Variable de entorno que, si existe, reemplaza la ruta de LOG_FILE
+LOG_MAX_BYTES = 10 * 1024 * 1024       # Tamaño máximo de pdf_extractor.log antes de rotarlo (10 MB)
+LOG_BACKUP_COUNT = 5                   # Archivos rotados que se conservan (pdf_extractor.log.1 ... .5)
+LOG_ERROR_LIMIT = 5                    # Errores repetidos que se registran por ventana antes de descartarlos
+LOG_ERROR_WINDOW = 60                  # Duración de la ventana de limitación de errores (segundos)
+
+# Identificador del trabajo en curso en el hilo actual; se adjunta a cada registro
+trabajo_actual = contextvars.ContextVar('trabajo_actual', default=None)
+
+# Campos estructurados opcionales que se pueden pasar con extra={...} en cada llamada al logger
+CAMPOS_ESTRUCTURADOS = ('job_id', 'file', 'stage', 'duration_ms', 'suppressed')
+
+
+class ContextoTrabajoFilter(logging.Filter):
+    # Adjunta el ID del trabajo en curso; se ejecuta en el hilo que emite el registro
+    def filter(self, record):
+        if getattr(record, 'job_id', None) is None:
+            record.job_id = trabajo_actual.get()
+        return True
+
+
+class LimiteErroresFilter(logging.Filter):
+    # Limita los registros WARNING o superiores que se repiten idénticos (misma línea de código, mismo
+    # mensaje y mismo tipo de excepción): deja pasar LOG_ERROR_LIMIT por ventana y, al cerrarse la
+    # ventana, envía un resumen con cuántos se descartaron
+    def __init__(self, destino: logging.Handler, limite: int = LOG_ERROR_LIMIT, ventana: float = LOG_ERROR_WINDOW):
+        super().__init__()
+        self.destino = destino
+        self.limite = limite
+        self.ventana = ventana
+        self._lock = threading.Lock()
+        self._contadores = {}
+        self._detener = threading.Event()
+        self._vigilante = threading.Thread(target=self._vigilar, name="log-limite", daemon=True)
+        self._vigilante.start()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+
+        excepcion = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else None
+        clave = (record.pathname, record.lineno, str(record.msg), repr(record.args), excepcion)
+        ahora = time.monotonic()
+        with self._lock:
+            contador = self._contadores.get(clave)
+            if contador and ahora - contador['inicio'] >= self.ventana:
+                self._resumir(self._contadores.pop(clave))
+                contador = None
+            if contador is None:
+                contador = self._contadores[clave] = {'inicio': ahora, 'emitidos': 0, 'descartados': 0}
+            if contador['emitidos'] >= self.limite:
+                contador['descartados'] += 1
+                # Solo se conservan los datos del registro necesarios para el resumen, no su traceback
+                contador['ultimo'] = {
+                    'name': record.name, 'levelno': record.levelno, 'levelname': record.levelname,
+                    'pathname': record.pathname, 'lineno': record.lineno, 'funcName': record.funcName,
+                    'message': record.getMessage(), 'job_id': getattr(record, 'job_id', None),
+                }
+                return False
+            contador['emitidos'] += 1
+        return True
+
+    def vaciar(self, todo: bool = False):
+        # Cierra las ventanas vencidas (o todas) y envía el resumen de los registros descartados
+        ahora = time.monotonic()
+        with self._lock:
+            for clave, contador in list(self._contadores.items()):
+                if todo or ahora - contador['inicio'] >= self.ventana:
+                    self._resumir(self._contadores.pop(clave))
+
+    def detener(self):
+        # Detiene el hilo vigilante y envía los resúmenes pendientes
+        self._detener.set()
+        self.vaciar(todo=True)
+
+    def _vigilar(self):
+        # Revisa periódicamente las ventanas para no perder el resumen si el error deja de repetirse
+        while not self._detener.wait(min(self.ventana, 1.0)):
+            self.vaciar()
+
+    def _resumir(self, contador):
+        # Emite un único registro con el mensaje repetido y el número de veces que se descartó
+        if not contador['descartados']:
+            return
+        ultimo = contador['ultimo']
+        resumen = logging.makeLogRecord({
+            'name': ultimo['name'], 'levelno': ultimo['levelno'], 'levelname': ultimo['levelname'],
+            'pathname': ultimo['pathname'], 'lineno': ultimo['lineno'], 'funcName': ultimo['funcName'],
+            'msg': "%s (repetido %d veces más en %g s)",
+            'args': (ultimo['message'], contador['descartados'], self.ventana),
+            'job_id': ultimo['job_id'], 'suppressed': contador['descartados'],
+        })
+        # Se entrega directamente al manejador para que el resumen no pase otra vez por los filtros
+        self.destino.emit(resumen)
+
+
+# Formateador usado solo para convertir excepciones en texto antes de encolarlas
+_FORMATEADOR_EXCEPCIONES = logging.Formatter()
+
+
+class EstructuradoQueueHandler(QueueHandler):
+    # QueueHandler.prepare descarta exc_info al preparar el registro para la cola; aquí se conserva
+    # el traceback como texto en exc_text para que cada formateador lo muestre a su manera
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _FORMATEADOR_EXCEPCIONES.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    # Serializa cada registro como una línea JSON con sus campos estructurados
+    def format(self, record):
+        registro = {
+            'timestamp': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for campo in CAMPOS_ESTRUCTURADOS:
+            valor = getattr(record, campo, None)
+            if valor is not None:
+                registro[campo] = valor
+        if record.exc_info:
+            registro['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            registro['exception'] = record.exc_text
+        return json.dumps(registro, ensure_ascii=False, default=str)
+
+
+def configurar_logging():
+    # Envía los registros a una cola; un hilo en segundo plano los escribe en consola y en el
+    # archivo rotativo, de modo que las rutas de extracción no esperan por la E/S del disco
+    root = logging.getLogger()
+    if any(isinstance(handler, QueueHandler) for handler in root.handlers):
+        return
+
+    archivo = RotatingFileHandler(os.environ.get(LOG_FILE_ENV) or LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    archivo.setFormatter(JsonFormatter())
+    consola = logging.StreamHandler(sys.stdout)
+    consola.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    cola = queue.SimpleQueue()
+    queue_handler = EstructuradoQueueHandler(cola)
+    limite_errores = LimiteErroresFilter(queue_handler)
+    queue_handler.addFilter(ContextoTrabajoFilter())
+    queue_handler.addFilter(limite_errores)
+
+    root.setLevel(logging.INFO)
+    root.addHandler(queue_handler)
+
+    listener = QueueListener(cola, archivo, consola, respect_handler_level=True)
+    listener.start()
+    # Vacía la cola antes de terminar el proceso para no perder los últimos registros;
+    # atexit ejecuta en orden inverso, así los resúmenes pendientes se encolan antes de detener el listener
+    atexit.register(listener.stop)
+    atexit.register(limite_errores.detener)
+
 
 # Configuración del sistema de logging para registrar eventos y errores
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('pdf_extractor.log'),  # Guarda logs en archivo
-        logging.StreamHandler(sys.stdout)          # Muestra logs en consola
-    ]
-)
+configurar_logging()
 logger = logging.getLogger('pdf_extractor')
 
 # Diccionario de mapeo de nombres de meses a números (para procesamiento de fechas)
@@ -18,6 +178,36 @@ MESES = { 'Enero': 1, 'Febrero': 2, 'Marzo': 3, 'Abril': 4, 'Mayo': 5, 'Junio':
 # Constante que define los días de anticipación para alertas de vencimiento
 DIAS_ALERTA_VENCIMIENTO = 30  
 
+# Límites para la ingesta de archivos subidos por streaming (endpoint /procesar-subida)
+MAX_UPLOAD_BYTES = 500 * 1024 * 1024   # Tamaño máximo aceptado por petición (500 MB)
+UPLOAD_CHUNK_SIZE = 64 * 1024          # Bytes leídos del socket en cada iteración
+MAX_CONCURRENT_UPLOADS = 3             # Subidas simultáneas permitidas en el servidor
+UPLOAD_WORKERS = 2                     # Hilos de extracción por cada subida
+UPLOAD_MAX_PENDING = 4                 # Archivos en cola antes de pausar la lectura del socket
+
+# Trabajos de procesamiento masivo que se ejecutan a la vez; el resto espera en cola
+MAX_CONCURRENT_JOBS = 2
+JOB_RESULT_TTL = 60 * 60               # Segundos que se conserva un trabajo terminado (y su process_id) antes de olvidarlo
+
+# Simulación (dry run) de un procesamiento masivo: PDFs muestreados por carpeta y carpetas más lentas reportadas
+DRY_RUN_SAMPLE_SIZE = 3
+DRY_RUN_SLOWEST_ITEMS = 5
+DRY_RUN_EXCEL_ROWS = 200               # Filas del Excel de prueba con el que se mide el costo por fila
+
+# Carpeta donde cada trabajo crea su propio espacio de trabajo (temporales y resultados sin publicar)
+WORKSPACE_ROOT = os.path.join(tempfile.gettempdir(), 'pdf_extractor_trabajos')
+
+# Almacén SQLite con los documentos extraídos en todas las ejecuciones
+DB_FILE = 'documentos_extraidos.db'
+DB_BATCH_SIZE = 500                    # Registros por lote en las inserciones masivas
+DB_QUERY_LIMIT = 100                   # Resultados máximos por consulta si no se indica otro límite
+
+# Prefiltro que descarta PDFs que no son certificados antes de la extracción completa
+PREFILTRO_ACTIVO = True
+PREFILTRO_MIN_BYTES = 1024                     # Por debajo de este tamaño el PDF se considera vacío
+PREFILTRO_MAX_BYTES = 10 * 1024 * 1024         # Los certificados pesan pocos KB; fotos escaneadas y manuales mucho más
+PREFILTRO_MAX_PAGINAS = 5                      # Los certificados ocupan una o dos páginas
+
 # Verifica si la librería rarfile está disponible para soportar archivos RAR
 try:
     import rarfile
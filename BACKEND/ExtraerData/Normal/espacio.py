@@ -0,0 +1,49 @@
+import os, re, shutil, tempfile
+from typing import Optional
+from .configuracion import WORKSPACE_ROOT, logger
+
+
+class JobWorkspace:
+
+    def __init__(self, job_id: Optional[str] = None, base_dir: str = WORKSPACE_ROOT):
+        # Crea un directorio exclusivo para el trabajo con subcarpetas para temporales y resultados
+        os.makedirs(base_dir, exist_ok=True)
+        nombre = re.sub(r'[^0-9A-Za-z_-]', '_', job_id or 'trabajo')[:40]
+        self.job_id = job_id
+        self.path = tempfile.mkdtemp(prefix=f"{nombre}_", dir=base_dir)
+        # Nombre único del directorio; identifica al trabajo en los registros y en los resultados publicados
+        self.id = os.path.basename(self.path)
+        self.temp_root = os.path.join(self.path, 'tmp')
+        self.output_dir = os.path.join(self.path, 'salida')
+        os.makedirs(self.temp_root)
+        os.makedirs(self.output_dir)
+
+    def staging_path(self, filename: str) -> str:
+        # Ruta dentro del espacio de trabajo donde se genera un resultado antes de publicarlo
+        return os.path.join(self.output_dir, filename)
+
+    def publish(self, staging_path: str, dest_path: str) -> str:
+        # Publica un resultado de forma atómica: se copia a un archivo oculto en el directorio destino
+        # y se renombra con os.replace, así nadie ve nunca un archivo a medio escribir
+        dest_dir = os.path.dirname(dest_path) or '.'
+        os.makedirs(dest_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(dest_path)}.", suffix='.part', dir=dest_dir)
+        os.close(fd)
+        try:
+            shutil.copyfile(staging_path, tmp_path)
+            os.replace(tmp_path, dest_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        logger.info("Resultado publicado: %s", dest_path, extra={"file": os.path.basename(dest_path), "stage": "publicacion"})
+        return dest_path
+
+    def cleanup(self):
+        # Elimina el espacio de trabajo completo con sus temporales y resultados intermedios
+        if self.path and os.path.exists(self.path):
+            try:
+                shutil.rmtree(self.path)
+                self.path = None
+            except Exception as e:
+                logger.error("Error limpiando el espacio de trabajo: %s", e)
@@ -5,8 +5,9 @@ from pathlib import Path
 from openpyxl.styles import Font, Alignment
 from openpyxl.worksheet.datavalidation import DataValidation
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 from .modelos import DocumentoData
+from .espacio import JobWorkspace
 from .configuracion import logger
 
 class ExcelExporter:
@@ -15,11 +16,16 @@ class ExcelExporter:
         # Inicializa el exportador de Excel sin configuración específica
         pass
     
-    def export_to_excel(self, extracted_data: List[DocumentoData], ficha: str) -> str:
+    def export_to_excel(self, extracted_data: List[DocumentoData], ficha: str, workspace: Optional[JobWorkspace] = None) -> str:
         # Exporta los datos extraídos a un archivo Excel con formato y validaciones
+        # El libro se genera en el espacio de trabajo del trabajo y luego se publica de forma atómica
         if not extracted_data:
             raise ValueError("No hay datos para exportar")
 
+        own_workspace = workspace is None
+        if own_workspace:
+            workspace = JobWorkspace("excel")
+
         try:
             # Prepara los datos para crear el DataFrame de pandas
             data_for_df = []
@@ -30,25 +36,40 @@ class ExcelExporter:
             # Crea DataFrame de pandas con los datos estructurados
             df = pd.DataFrame(data_for_df)
 
-            # Define la ruta de guardado en la carpeta Descargas del usuario
-            filename = f'plantilla_{ficha}.xlsx'
+            # Define la ruta de guardado en la carpeta Descargas del usuario; el ID del espacio de trabajo
+            # en el nombre evita que dos trabajos con la misma ficha se sobrescriban el resultado
+            # La ficha puede llegar de un cliente remoto: se limpia antes de usarla en el nombre de archivo
+            filename = f'plantilla_{self.clean_filename(ficha)}_{workspace.id}.xlsx'
             downloads_path = str(Path.home() / "Downloads")
             file_path = os.path.join(downloads_path, filename)
+            staging_path = workspace.staging_path(filename)
 
             # Guarda el DataFrame en archivo Excel usando openpyxl como motor
-            with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
+            with pd.ExcelWriter(staging_path, engine='openpyxl') as writer:
                 df.to_excel(writer, sheet_name='Datos', index=False)
 
             # Aplica formato visual y validaciones de datos al archivo Excel
-            self.ajustar_formato_excel(file_path)
-            self.agregar_validaciones_excel(file_path)
+            self.ajustar_formato_excel(staging_path)
+            self.agregar_validaciones_excel(staging_path)
+
+            workspace.publish(staging_path, file_path)
 
-            logger.info(f"Datos exportados exitosamente a: {file_path}")
+            logger.info("Datos exportados exitosamente a: %s", file_path)
             return file_path
 
         except Exception as e:
-            logger.error(f"Error exportando a Excel: {e}")
+            logger.error("Error exportando a Excel: %s", e)
             raise
+        finally:
+            if own_workspace:
+                workspace.cleanup()
+
+    def clean_filename(self, filename: str) -> str:
+        # Limpia el nombre de archivo removiendo caracteres inválidos y limitando su longitud
+        invalid_chars = '<>:"/\\|?*'
+        for char in invalid_chars:
+            filename = filename.replace(char, '_')
+        return filename[:50]  # Limita la longitud del nombre
 
     def ajustar_formato_excel(self, file_path: str):
         # Aplica formato visual al archivo Excel (ancho de columnas y estilo de encabezados)
@@ -180,9 +201,9 @@ class ExcelExporter:
             self.ajustar_formato_excel(file_path)
             self.agregar_validaciones_excel(file_path)
 
-            logger.info(f"Datos exportados exitosamente a: {file_path}")
+            logger.info("Datos exportados exitosamente a: %s", file_path)
             return file_path
 
         except Exception as e:
-            logger.error(f"Error exportando a Excel: {e}")
+            logger.error("Error exportando a Excel: %s", e)
             raise
\ No newline at end of file
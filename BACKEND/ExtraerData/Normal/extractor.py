@@ -1,24 +1,73 @@
 import re
+import pandas as pd
+from dataclasses import asdict, fields
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List, Sequence, Tuple
 from .modelos import DocumentoData
 from .configuracion import MESES, logger
 
+# Patrones que identifican el tipo de documento, en orden de prioridad
+PATRONES_TIPO = [
+    ('CC', re.compile(r'C[eé]dula de Ciudadan[ií]a', re.IGNORECASE)),
+    ('TI', re.compile(r'Número Único de Identificación Personal', re.IGNORECASE)),
+    ('PPT', re.compile(r'Permiso Por Protección Temporal|PPT|RUMV', re.IGNORECASE)),
+    ('CE', re.compile(r'C[eé]dula de Extranjer[ií]a', re.IGNORECASE)),
+]
+
+# Patrones de extracción de campos por tipo de documento (compartidos por la extracción individual y por lotes)
+PATRONES_CAMPOS = {
+    'CC': {
+        'numero': re.compile(r'C[eé]dula de Ciudadan[ií]a:\s*([\d\.]+)'),
+        'fecha': re.compile(r'Fecha de Expedici[oó]n:\s*(\d{1,2})\s+DE\s+([A-Z]+)\s+DE\s+(\d{4})', re.IGNORECASE),
+        'vigencia': re.compile(r'válida en todo el territorio nacional hasta el (\d{1,2}) de ([A-Za-z]+) de (\d{4})', re.IGNORECASE),
+        'nombres': re.compile(r'A nombre de:\s*([A-ZÁÉÍÓÚÑ\s]+?)(?=\n|Estado|$)', re.IGNORECASE),
+    },
+    'TI': {
+        'numero': re.compile(r'Número Único de Identificación Personal\s+(\d+)', re.IGNORECASE),
+        'fecha': re.compile(r'el\s+(\d{1,2})\s+DE\s+([A-Z]+)\s+DE\s+(\d{4})', re.IGNORECASE),
+        'nombres': re.compile(r'certifica que una vez consultado.*?,\s+([A-ZÁÉÍÓÚÑ\s]+)\s+tiene inscrito', re.IGNORECASE | re.DOTALL),
+    },
+    'PPT': {
+        'numero': re.compile(r'(?:PPT|RUMV)\s+(?:número|numero)?\s*[:]?\s*(\d+)', re.IGNORECASE),
+        'fecha': re.compile(r'a los\s+(\d{1,2})\s+días del mes de\s+([A-Za-z]+)\s+de\s+(\d{4})', re.IGNORECASE),
+        'nombres': re.compile(r'el migrante venezolano\s+([A-ZÁÉÍÓÚÑ\s]+?)\s+surtió', re.IGNORECASE),
+    },
+    'CE': {
+        'numero': re.compile(r'C[eé]dula de Extranjer[ií]a:\s*(\d+)', re.IGNORECASE),
+        'fecha': re.compile(r'Fecha de Expedici[oó]n:\s*(\d{4})/(\d{2})/(\d{2})', re.IGNORECASE),
+        'nombres': re.compile(r'Nombres y Apellidos\s+([A-ZÁÉÍÓÚÑ\s]+)(?=\n|Fecha de Nacimiento)', re.IGNORECASE),
+    },
+}
+
+# Nombres de los meses en mayúsculas indexados por número (1-12)
+NOMBRES_MES = {
+    1: 'ENERO', 2: 'FEBRERO', 3: 'MARZO', 4: 'ABRIL', 5: 'MAYO', 6: 'JUNIO', 
+    7: 'JULIO', 8: 'AGOSTO', 9: 'SEPTIEMBRE', 10: 'OCTUBRE', 11: 'NOVIEMBRE', 12: 'DICIEMBRE'}
+
+# Columnas del resultado por lotes: una por cada campo de DocumentoData
+COLUMNAS_DOCUMENTO = [f.name for f in fields(DocumentoData)]
+
+# Columnas que calcula cada extractor por lotes; el resto las completa extract_documents_batch
+COLUMNAS_CAMPOS = ['numero_documento', 'nombres_apellidos', 'dia', 'mes', 'año', 'fecha_vigencia']
+
 class DocumentExtractor:
     
     def __init__(self):
         # Inicializa el extractor de documentos sin configuración específica
         pass
     
-    def extract_text_from_pdf(self, pdf_path: str) -> str:
+    def extract_text_from_pdf(self, pdf_path: str, pdf=None) -> str:
         # Extrae texto de un archivo PDF usando pdfplumber, página por página
-        import pdfplumber
+        # Si se recibe el PDF ya abierto (por ejemplo, por el prefiltro) se reutiliza sin volver a abrirlo
+        if pdf is None:
+            import pdfplumber
+            with pdfplumber.open(pdf_path) as pdf:
+                return self.extract_text_from_pdf(pdf_path, pdf)
         text = ''
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + '\n'
+        for page in pdf.pages:
+            page_text = page.extract_text()
+            if page_text:
+                text += page_text + '\n'
         return text
         
     def extract_document_data(self, text: str, filename: str) -> Optional[DocumentoData]:
@@ -40,32 +89,184 @@ class DocumentExtractor:
                 return None
                 
         except Exception as e:
-            logger.error(f"Error extrayendo datos del documento: {e}")
+            logger.error("Error extrayendo datos del documento: %s", e, extra={"file": filename, "stage": "extraccion_campos"})
             return None
     
+    def extract_documents_batch(self, documentos: Sequence[Tuple[str, str]]) -> pd.DataFrame:
+        # Versión por lotes de extract_document_data: recibe pares (texto, nombre de archivo) y devuelve
+        # un DataFrame con una fila por documento válido, indexado por su posición en la entrada.
+        # No es más rápida que extract_document_data (las expresiones regulares se evalúan fila a fila
+        # igualmente y pandas añade ~40 ms fijos), así que el procesamiento de PDFs usa la versión
+        # individual; esta sirve a quien ya tiene los textos en memoria y quiere el resultado en columnas
+        if not documentos:
+            return pd.DataFrame(columns=COLUMNAS_DOCUMENTO)
+
+        textos = pd.Series([texto or '' for texto, _ in documentos], dtype=object)
+        archivos = pd.Series([archivo for _, archivo in documentos], dtype=object)
+
+        # Clasifica todos los textos a la vez y agrupa por tipo de documento
+        tipos = self.determinar_tipo_documento_batch(textos)
+        extractores = {'CC': self._extract_batch_cc, 'TI': self._extract_batch_ti, 'PPT': self._extract_batch_ppt, 'CE': self._extract_batch_ce}
+        por_documento = {'CC': self.extract_data_cc, 'TI': self.extract_data_ti, 'PPT': self.extract_data_ppt, 'CE': self.extract_data_ce}
+
+        resultados = []
+        for tipo, indices in tipos.groupby(tipos).groups.items():
+            if tipo not in extractores:
+                continue
+            try:
+                resultado = extractores[tipo](textos.loc[indices], archivos.loc[indices])
+            except Exception as e:
+                # Un fallo del lote no descarta el grupo: se repite documento a documento y cada error solo afecta a su fila
+                logger.error("Error extrayendo datos de %s por lotes, se reintenta por documento: %s", tipo, e, extra={"stage": "extraccion_campos"})
+                resultado = self._extraer_por_documento(por_documento[tipo], textos.loc[indices], archivos.loc[indices])
+            resultado.insert(0, 'tipo_documento', tipo)
+            resultado['dias_restantes'] = "N/A"
+            resultado['estado'] = 'EXTRAÍDO'
+            resultado['archivo_origen'] = archivos.loc[resultado.index]
+            resultados.append(resultado)
+
+        if not resultados:
+            return pd.DataFrame(columns=COLUMNAS_DOCUMENTO)
+        resultado = pd.concat(resultados)[COLUMNAS_DOCUMENTO].sort_index()
+        # pd.concat convierte los None en NaN; se restauran para igualar la extracción individual
+        resultado['fecha_vigencia'] = resultado['fecha_vigencia'].astype(object).where(resultado['fecha_vigencia'].notna(), None)
+        return resultado
+
+    def batch_to_documentos(self, resultado: pd.DataFrame) -> List[DocumentoData]:
+        # Convierte el resultado columnar de extract_documents_batch en objetos DocumentoData
+        return [DocumentoData(**registro) for registro in resultado.to_dict('records')]
+
+    def determinar_tipo_documento_batch(self, textos: pd.Series) -> pd.Series:
+        # Clasifica una serie de textos respetando la misma prioridad que determinar_tipo_documento
+        tipos = pd.Series('DESCONOCIDO', index=textos.index, dtype=object)
+        pendientes = textos
+        for tipo, patron in PATRONES_TIPO:
+            if pendientes.empty:
+                break
+            coincide = pendientes.str.contains(patron.pattern, flags=patron.flags, regex=True)
+            tipos.loc[coincide[coincide].index] = tipo
+            pendientes = pendientes[~coincide]
+        return tipos
+
+    def _extraer_por_documento(self, extraer, textos: pd.Series, archivos: pd.Series) -> pd.DataFrame:
+        # Respaldo de un lote fallido: aplica el extractor individual a cada fila con las mismas columnas del lote
+        indices, registros = [], []
+        for indice in textos.index:
+            documento = extraer(textos[indice], archivos[indice])
+            if documento:
+                indices.append(indice)
+                registros.append(asdict(documento))
+        return pd.DataFrame(registros, index=indices, columns=COLUMNAS_CAMPOS, dtype=object)
+
+    def _extraer(self, textos: pd.Series, patron: re.Pattern) -> pd.DataFrame:
+        # Aplica un patrón compilado a toda la serie; las filas sin coincidencia quedan en NaN
+        return textos.str.extract(patron.pattern, flags=patron.flags, expand=True)
+
+    def _campos_nombres(self, nombres: pd.Series) -> pd.Series:
+        # Limpia los nombres extraídos y usa "N/A" cuando no hubo coincidencia
+        return nombres.str.strip().where(nombres.notna(), "N/A")
+
+    def _extract_batch_cc(self, textos: pd.Series, archivos: pd.Series) -> pd.DataFrame:
+        # Equivalente por lotes de extract_data_cc
+        patrones = PATRONES_CAMPOS['CC']
+        cedula = self._extraer(textos, patrones['numero'])
+        fecha = self._extraer(textos, patrones['fecha'])
+        vigencia = self._extraer(textos, patrones['vigencia'])
+        nombres = self._extraer(textos, patrones['nombres'])[0]
+
+        validos = cedula[0].notna() & fecha[0].notna() & vigencia[0].notna()
+        cedula, fecha, vigencia, nombres = cedula[validos], fecha[validos], vigencia[validos], nombres[validos]
+
+        # La fecha de vigencia se construye fila a fila para conservar el rango completo de datetime
+        meses_v = vigencia[1].str.capitalize().map(MESES).fillna(1).astype(int)
+        fechas_vigencia = {}
+        for indice, anio_v, mes_v, dia_v in zip(vigencia.index, vigencia[2], meses_v, vigencia[0]):
+            try:
+                fechas_vigencia[indice] = datetime(int(anio_v), mes_v, int(dia_v))
+            except ValueError as e:
+                logger.error("Error extrayendo datos de CC: %s", e, extra={"file": archivos[indice], "stage": "extraccion_campos"})
+
+        indices = list(fechas_vigencia)
+        return pd.DataFrame({
+            'numero_documento': cedula.loc[indices, 0].str.replace('.', '', regex=False),
+            'nombres_apellidos': self._campos_nombres(nombres.loc[indices]),
+            'dia': fecha.loc[indices, 0],
+            'mes': fecha.loc[indices, 1].str.capitalize(),
+            'año': fecha.loc[indices, 2],
+            'fecha_vigencia': pd.Series(fechas_vigencia, index=indices, dtype=object),
+        }, index=indices)
+
+    def _extract_batch_ti(self, textos: pd.Series, archivos: pd.Series) -> pd.DataFrame:
+        # Equivalente por lotes de extract_data_ti
+        patrones = PATRONES_CAMPOS['TI']
+        numero = self._extraer(textos, patrones['numero'])[0]
+        fecha = self._extraer(textos, patrones['fecha'])
+        nombres = self._extraer(textos, patrones['nombres'])[0]
+
+        validos = numero.notna() & fecha[0].notna()
+        nombres = nombres[validos]
+        return pd.DataFrame({
+            'numero_documento': numero[validos],
+            'nombres_apellidos': nombres.str.split().str.join(' ').where(nombres.notna(), "N/A"),
+            'dia': fecha.loc[validos, 0],
+            'mes': fecha.loc[validos, 1].str.capitalize(),
+            'año': fecha.loc[validos, 2],
+            'fecha_vigencia': pd.Series(None, index=nombres.index, dtype=object),
+        })
+
+    def _extract_batch_ppt(self, textos: pd.Series, archivos: pd.Series) -> pd.DataFrame:
+        # Equivalente por lotes de extract_data_ppt
+        patrones = PATRONES_CAMPOS['PPT']
+        numero = self._extraer(textos, patrones['numero'])[0]
+        fecha = self._extraer(textos, patrones['fecha'])
+        nombres = self._extraer(textos, patrones['nombres'])[0]
+
+        validos = numero.notna() & fecha[0].notna()
+        return pd.DataFrame({
+            'numero_documento': numero[validos],
+            'nombres_apellidos': self._campos_nombres(nombres[validos]),
+            'dia': fecha.loc[validos, 0],
+            'mes': fecha.loc[validos, 1].str.capitalize(),
+            'año': fecha.loc[validos, 2],
+            'fecha_vigencia': pd.Series(None, index=numero[validos].index, dtype=object),
+        })
+
+    def _extract_batch_ce(self, textos: pd.Series, archivos: pd.Series) -> pd.DataFrame:
+        # Equivalente por lotes de extract_data_ce (fecha numérica YYYY/MM/DD -> día, mes en texto, año)
+        patrones = PATRONES_CAMPOS['CE']
+        cedula = self._extraer(textos, patrones['numero'])[0]
+        fecha = self._extraer(textos, patrones['fecha'])
+        nombres = self._extraer(textos, patrones['nombres'])[0]
+
+        validos = cedula.notna() & fecha[0].notna()
+        fecha = fecha[validos]
+        return pd.DataFrame({
+            'numero_documento': cedula[validos],
+            'nombres_apellidos': self._campos_nombres(nombres[validos]),
+            'dia': fecha[2],
+            'mes': fecha[1].astype(int).map(NOMBRES_MES).fillna('ENERO'),
+            'año': fecha[0],
+            'fecha_vigencia': pd.Series(None, index=fecha.index, dtype=object),
+        })
+
     def determinar_tipo_documento(self, text: str) -> str:
         # Detecta el tipo de documento analizando patrones de texto específicos
-        if re.search(r'C[eé]dula de Ciudadan[ií]a', text, re.IGNORECASE):
-            return 'CC'
-        elif re.search(r'Número Único de Identificación Personal', text, re.IGNORECASE):
-            return 'TI'
-        elif re.search(r'Permiso Por Protección Temporal|PPT|RUMV', text, re.IGNORECASE):
-            return 'PPT'
-        elif re.search(r'C[eé]dula de Extranjer[ií]a', text, re.IGNORECASE):
-            return 'CE'
-        else:
-            return 'DESCONOCIDO'
+        for tipo, patron in PATRONES_TIPO:
+            if patron.search(text):
+                return tipo
+        return 'DESCONOCIDO'
     
     def extract_data_cc(self, text: str, filename: str) -> Optional[DocumentoData]:
         # Extrae datos específicos de Cédula de Ciudadanía colombiana
         try:
             # Patrones de expresión regular para cédula, fecha de expedición y vigencia
-            cedula_match = re.search(r'C[eé]dula de Ciudadan[ií]a:\s*([\d\.]+)', text)
-            fecha_match = re.search(r'Fecha de Expedici[oó]n:\s*(\d{1,2})\s+DE\s+([A-Z]+)\s+DE\s+(\d{4})', text, re.IGNORECASE)
-            vigencia_match = re.search(r'válida en todo el territorio nacional hasta el (\d{1,2}) de ([A-Za-z]+) de (\d{4})', text, re.IGNORECASE)
+            patrones = PATRONES_CAMPOS['CC']
+            cedula_match = patrones['numero'].search(text)
+            fecha_match = patrones['fecha'].search(text)
+            vigencia_match = patrones['vigencia'].search(text)
             
             # Extrae nombres y apellidos del titular
-            nombres_apellidos_match = re.search(r'A nombre de:\s*([A-ZÁÉÍÓÚÑ\s]+?)(?=\n|Estado|$)', text, re.IGNORECASE)
+            nombres_apellidos_match = patrones['nombres'].search(text)
             
             if not cedula_match or not fecha_match or not vigencia_match:
                 return None
@@ -88,18 +289,19 @@ class DocumentExtractor:
             return DocumentoData(tipo_documento='CC', numero_documento=cedula, nombres_apellidos=nombres_apellidos, dia=dia, mes=mes, año=anio, fecha_vigencia=fecha_vigencia, dias_restantes="N/A", estado=estado, archivo_origen=filename )
             
         except Exception as e:
-            logger.error(f"Error extrayendo datos de CC: {e}")
+            logger.error("Error extrayendo datos de CC: %s", e, extra={"file": filename, "stage": "extraccion_campos"})
             return None
     
     def extract_data_ti(self, text: str, filename: str) -> Optional[DocumentoData]:
         # Extrae datos de Tarjeta de Identidad colombiana
         try:
             # Patrones para número de documento y fecha de expedición
-            numero_match = re.search(r'Número Único de Identificación Personal\s+(\d+)', text, re.IGNORECASE)
-            fecha_match = re.search(r'el\s+(\d{1,2})\s+DE\s+([A-Z]+)\s+DE\s+(\d{4})', text, re.IGNORECASE)
+            patrones = PATRONES_CAMPOS['TI']
+            numero_match = patrones['numero'].search(text)
+            fecha_match = patrones['fecha'].search(text)
             
             # Patrón mejorado para extraer nombres del titular
-            nombres_match = re.search(r'certifica que una vez consultado.*?,\s+([A-ZÁÉÍÓÚÑ\s]+)\s+tiene inscrito', text, re.IGNORECASE | re.DOTALL)
+            nombres_match = patrones['nombres'].search(text)
             
             if not numero_match or not fecha_match:
                 return None
@@ -119,16 +321,17 @@ class DocumentExtractor:
             return DocumentoData(tipo_documento='TI', numero_documento=numero_documento, nombres_apellidos=nombres_apellidos, dia=dia, mes=mes, año=anio, fecha_vigencia=fecha_vigencia, dias_restantes="N/A", estado=estado, archivo_origen=filename )
             
         except Exception as e:
-            logger.error(f"Error extrayendo datos de TI: {e}")
+            logger.error("Error extrayendo datos de TI: %s", e, extra={"file": filename, "stage": "extraccion_campos"})
             return None
 
     def extract_data_ppt(self, text: str, filename: str) -> Optional[DocumentoData]:
         # Extrae datos de Permiso por Protección Temporal (migrantes venezolanos)
         try:
             # Patrones para número PPT/RUMV, fecha de expedición y nombres
-            numero_match = re.search(r'(?:PPT|RUMV)\s+(?:número|numero)?\s*[:]?\s*(\d+)', text, re.IGNORECASE)
-            fecha_match = re.search(r'a los\s+(\d{1,2})\s+días del mes de\s+([A-Za-z]+)\s+de\s+(\d{4})', text, re.IGNORECASE)
-            nombres_match = re.search(r'el migrante venezolano\s+([A-ZÁÉÍÓÚÑ\s]+?)\s+surtió', text, re.IGNORECASE)
+            patrones = PATRONES_CAMPOS['PPT']
+            numero_match = patrones['numero'].search(text)
+            fecha_match = patrones['fecha'].search(text)
+            nombres_match = patrones['nombres'].search(text)
             
             if not numero_match or not fecha_match:
                 return None
@@ -146,16 +349,17 @@ class DocumentExtractor:
             return DocumentoData(tipo_documento='PPT', numero_documento=numero_documento, nombres_apellidos=nombres_apellidos, dia=dia, mes=mes, año=anio, fecha_vigencia=fecha_vigencia, dias_restantes="N/A",estado=estado, archivo_origen=filename)
             
         except Exception as e:
-            logger.error(f"Error extrayendo datos de PPT: {e}")
+            logger.error("Error extrayendo datos de PPT: %s", e, extra={"file": filename, "stage": "extraccion_campos"})
             return None
 
     def extract_data_ce(self, text: str, filename: str) -> Optional[DocumentoData]:
         # Extrae datos de Cédula de Extranjería
         try:
             # Patrones para número de cédula, fecha de expedición y nombres
-            cedula_match = re.search(r'C[eé]dula de Extranjer[ií]a:\s*(\d+)', text, re.IGNORECASE)
-            fecha_expedicion_match = re.search(r'Fecha de Expedici[oó]n:\s*(\d{4})/(\d{2})/(\d{2})', text, re.IGNORECASE)
-            nombres_match = re.search(r'Nombres y Apellidos\s+([A-ZÁÉÍÓÚÑ\s]+)(?=\n|Fecha de Nacimiento)', text, re.IGNORECASE)
+            patrones = PATRONES_CAMPOS['CE']
+            cedula_match = patrones['numero'].search(text)
+            fecha_expedicion_match = patrones['fecha'].search(text)
+            nombres_match = patrones['nombres'].search(text)
             
             if not cedula_match or not fecha_expedicion_match:
                 return None
@@ -176,12 +380,9 @@ class DocumentExtractor:
             return DocumentoData(tipo_documento='CE', numero_documento=cedula, nombres_apellidos=nombres_apellidos, dia=dia, mes=mes, año=anio, fecha_vigencia=fecha_vigencia, dias_restantes="N/A", estado=estado, archivo_origen=filename)
             
         except Exception as e:
-            logger.error(f"Error extrayendo datos de CE: {e}")
+            logger.error("Error extrayendo datos de CE: %s", e, extra={"file": filename, "stage": "extraccion_campos"})
             return None
 
     def get_nombre_mes(self, numero_mes: int) -> str:
         # Convierte número de mes (1-12) a nombre del mes en español en mayúsculas
-        meses = {
-            1: 'ENERO', 2: 'FEBRERO', 3: 'MARZO', 4: 'ABRIL', 5: 'MAYO', 6: 'JUNIO', 
-            7: 'JULIO', 8: 'AGOSTO', 9: 'SEPTIEMBRE', 10: 'OCTUBRE', 11: 'NOVIEMBRE', 12: 'DICIEMBRE'}
-        return meses.get(numero_mes, 'ENERO')
\ No newline at end of file
+        return NOMBRES_MES.get(numero_mes, 'ENERO')
\ No newline at end of file
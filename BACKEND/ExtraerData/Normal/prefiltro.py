@@ -0,0 +1,130 @@
+import os, threading
+from collections import Counter
+from typing import Dict, Optional
+from .extractor import PATRONES_TIPO
+from .configuracion import PREFILTRO_ACTIVO, PREFILTRO_MIN_BYTES, PREFILTRO_MAX_BYTES, PREFILTRO_MAX_PAGINAS, logger
+
+# Motivos por los que el prefiltro descarta un PDF
+MOTIVO_VACIO = 'archivo_vacio'
+MOTIVO_TAMANO = 'tamano_excesivo'
+MOTIVO_PAGINAS = 'demasiadas_paginas'
+MOTIVO_INVALIDO = 'pdf_invalido'
+MOTIVO_SIN_TEXTO = 'sin_texto'
+MOTIVO_SIN_MARCADORES = 'sin_marcadores'
+
+# Campos de metadatos del PDF que se revisan en busca de los marcadores de documento
+CAMPOS_METADATOS = ('Title', 'Subject', 'Keywords')
+
+
+class PdfTriage:
+
+    def __init__(self, activo: bool = PREFILTRO_ACTIVO, min_bytes: int = PREFILTRO_MIN_BYTES,
+                 max_bytes: int = PREFILTRO_MAX_BYTES, max_paginas: int = PREFILTRO_MAX_PAGINAS):
+        # Inicializa el prefiltro con sus umbrales y los contadores de archivos descartados por motivo
+        self.activo = activo
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.max_paginas = max_paginas
+        self.descartados = Counter()
+        self.revisados = 0
+        self._lock = threading.Lock()
+
+    def is_candidate(self, pdf_path: str) -> bool:
+        # Indica si el PDF merece la extracción completa y registra el motivo si se descarta
+        if not self.activo:
+            return True
+        return self._registrar(pdf_path, self.evaluate(pdf_path))
+
+    def extract_candidate_text(self, pdf_path: str, extractor) -> Optional[str]:
+        # Aplica el prefiltro y, si el PDF es candidato, extrae su texto completo con el mismo documento
+        # abierto: pdfplumber conserva en caché los caracteres de la primera página que leyó el sondeo,
+        # así que cada candidato se abre y se analiza una sola vez. Devuelve None si el PDF se descarta;
+        # los errores de la extracción completa se propagan igual que en extract_text_from_pdf
+        if not self.activo:
+            return extractor.extract_text_from_pdf(pdf_path)
+
+        motivo = self._evaluar_tamano(pdf_path)
+        if motivo:
+            self._registrar(pdf_path, motivo)
+            return None
+
+        import pdfplumber
+        try:
+            pdf = pdfplumber.open(pdf_path)
+        except Exception:
+            self._registrar(pdf_path, MOTIVO_INVALIDO)
+            return None
+
+        with pdf:
+            if not self._registrar(pdf_path, self._evaluar_documento(pdf)):
+                return None
+            return extractor.extract_text_from_pdf(pdf_path, pdf)
+
+    def evaluate(self, pdf_path: str) -> Optional[str]:
+        # Aplica las comprobaciones de menor a mayor costo y devuelve el motivo de descarte (o None)
+        motivo = self._evaluar_tamano(pdf_path)
+        if motivo:
+            return motivo
+
+        import pdfplumber
+        try:
+            with pdfplumber.open(pdf_path) as pdf:
+                return self._evaluar_documento(pdf)
+        except Exception:
+            return MOTIVO_INVALIDO
+
+    def _evaluar_tamano(self, pdf_path: str) -> Optional[str]:
+        # Comprobaciones que no necesitan abrir el PDF
+        try:
+            tamano = os.path.getsize(pdf_path)
+        except OSError:
+            return MOTIVO_INVALIDO
+        if tamano < self.min_bytes:
+            return MOTIVO_VACIO
+        if tamano > self.max_bytes:
+            return MOTIVO_TAMANO
+        return None
+
+    def _evaluar_documento(self, pdf) -> Optional[str]:
+        # Comprobaciones sobre el PDF ya abierto: número de páginas, metadatos y texto de la primera página
+        try:
+            if len(pdf.pages) > self.max_paginas:
+                return MOTIVO_PAGINAS
+
+            # Si los metadatos ya mencionan el tipo de documento no hace falta leer la página
+            metadatos = ' '.join(str(pdf.metadata.get(campo, '')) for campo in CAMPOS_METADATOS)
+            if self._tiene_marcador(metadatos):
+                return None
+
+            # Sondeo rápido: texto sin análisis de diseño de la primera página únicamente
+            if not pdf.pages:
+                return MOTIVO_SIN_TEXTO
+            texto = pdf.pages[0].extract_text_simple()
+        except Exception:
+            return MOTIVO_INVALIDO
+
+        if not texto or not texto.strip():
+            return MOTIVO_SIN_TEXTO
+        if not self._tiene_marcador(texto):
+            return MOTIVO_SIN_MARCADORES
+        return None
+
+    def _registrar(self, pdf_path: str, motivo: Optional[str]) -> bool:
+        # Cuenta el PDF revisado y su motivo de descarte; devuelve True si es candidato
+        with self._lock:
+            self.revisados += 1
+            if motivo:
+                self.descartados[motivo] += 1
+        if motivo:
+            logger.debug("PDF descartado por el prefiltro (%s): %s", motivo, os.path.basename(pdf_path),
+                         extra={"file": os.path.basename(pdf_path), "stage": "prefiltro"})
+        return motivo is None
+
+    def _tiene_marcador(self, texto: str) -> bool:
+        # Busca los mismos marcadores CC/TI/PPT/CE que usa determinar_tipo_documento
+        return any(patron.search(texto) for _, patron in PATRONES_TIPO)
+
+    def resumen(self) -> Dict:
+        # Resumen de archivos revisados y descartados por motivo, para incluir en las respuestas
+        with self._lock:
+            return {"revisados": self.revisados, "descartados": sum(self.descartados.values()), "motivos": dict(self.descartados)}
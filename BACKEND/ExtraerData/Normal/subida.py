@@ -0,0 +1,186 @@
+import contextvars, os, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Dict, Optional
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+from .archivos import FileProcessor
+from .extractor import DocumentExtractor
+from .prefiltro import PdfTriage
+from .espacio import JobWorkspace
+from .modelos import DocumentoData
+from .configuracion import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_SIZE, UPLOAD_WORKERS, UPLOAD_MAX_PENDING, logger
+
+# Extensiones aceptadas dentro de una subida multipart
+EXTENSIONES_SUBIDA = ('.pdf', '.zip', '.rar')
+
+# Tamaño máximo de un campo de texto del formulario (por ejemplo "ficha")
+MAX_FIELD_BYTES = 1024
+
+# Margen para los encabezados de cada parte (Content-Disposition, Content-Type...)
+MAX_HEADER_BYTES = 16 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    # Se lanza cuando la subida supera el tamaño máximo permitido
+    pass
+
+
+class UploadProcessor:
+
+    def __init__(self, workspace: JobWorkspace, max_bytes: int = MAX_UPLOAD_BYTES, chunk_size: int = UPLOAD_CHUNK_SIZE,
+                 workers: int = UPLOAD_WORKERS, max_pending: int = UPLOAD_MAX_PENDING):
+        # Inicializa el procesador de subidas con sus límites de tamaño y concurrencia;
+        # todo lo que se vuelca a disco queda dentro del espacio de trabajo de la petición
+        self.workspace = workspace
+        self.extractor = DocumentExtractor()
+        self.triage = PdfTriage()
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.max_pending = max_pending
+        self.spool_dir = None
+        self.fields: Dict[str, str] = {}
+        self.archivos_recibidos = 0
+
+    def process_upload(self, stream, content_type: str, content_length: Optional[int] = None) -> List[DocumentoData]:
+        # Lee el cuerpo multipart por bloques, lo vuelca a disco y extrae los PDFs de cada parte
+        # en cuanto termina de llegar, mientras el resto de la subida sigue en curso
+        mimetype, options = parse_options_header(content_type or '')
+        boundary = options.get('boundary')
+        if mimetype != 'multipart/form-data' or not boundary:
+            raise ValueError("La petición debe ser multipart/form-data")
+
+        if content_length is not None and content_length > self.max_bytes:
+            raise UploadTooLargeError(f"La subida supera el tamaño máximo de {self.max_bytes} bytes")
+
+        self.spool_dir = tempfile.mkdtemp(prefix="upload_", dir=self.workspace.temp_root)
+        # El búfer del decodificador solo debe retener un bloque leído más un campo y sus encabezados;
+        # los datos de archivo se vuelcan a disco en cada evento
+        decoder = MultipartDecoder(boundary.encode('latin-1'),
+                                   max_form_memory_size=self.chunk_size + MAX_FIELD_BYTES + MAX_HEADER_BYTES)
+
+        # El semáforo limita las tareas pendientes: si se llena, se deja de leer del socket
+        pending = threading.Semaphore(self.max_pending)
+        futures: List[Future] = []
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="upload")
+        received = 0
+        current_file = None
+        current_path = None
+        current_field = None
+        field_buffer = bytearray()
+
+        try:
+            completed = False
+            while not completed:
+                chunk = stream.read(self.chunk_size)
+                received += len(chunk)
+                if received > self.max_bytes:
+                    raise UploadTooLargeError(f"La subida supera el tamaño máximo de {self.max_bytes} bytes")
+
+                decoder.receive_data(chunk if chunk else None)
+                event = decoder.next_event()
+                while not isinstance(event, NeedData):
+                    if isinstance(event, Field):
+                        current_field = event.name
+                        field_buffer = bytearray()
+                    elif isinstance(event, File):
+                        current_field = None
+                        current_path = self._spool_path(event.filename)
+                        current_file = open(current_path, 'wb') if current_path else None
+                    elif isinstance(event, Data):
+                        if current_file:
+                            current_file.write(event.data)
+                        elif current_field:
+                            field_buffer += event.data
+                            if len(field_buffer) > MAX_FIELD_BYTES:
+                                raise UploadTooLargeError(f"El campo {current_field} supera el tamaño máximo de {MAX_FIELD_BYTES} bytes")
+
+                        if not event.more_data:
+                            if current_file:
+                                current_file.close()
+                                current_file = None
+                                self.archivos_recibidos += 1
+                                futures.append(self._submit(pool, pending, current_path))
+                            elif current_field:
+                                self.fields[current_field] = field_buffer.decode('utf-8', errors='replace')
+                                current_field = None
+                            current_path = None
+                    elif isinstance(event, Epilogue):
+                        completed = True
+                        break
+                    event = decoder.next_event()
+
+                if not chunk and not completed:
+                    raise ValueError("La subida terminó antes de completarse")
+
+            # Espera a que terminen todas las extracciones y conserva el orden de llegada
+            documentos = []
+            for future in futures:
+                documentos.extend(future.result())
+            return documentos
+
+        except RequestEntityTooLarge:
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise UploadTooLargeError("Una parte de la subida supera el tamaño máximo permitido para encabezados o campos")
+        except Exception:
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+        finally:
+            if current_file:
+                current_file.close()
+            pool.shutdown(wait=True)
+
+    def _spool_path(self, filename: Optional[str]) -> Optional[str]:
+        # Calcula la ruta de volcado de una parte; ignora las extensiones no soportadas
+        nombre = os.path.basename((filename or '').replace('\\', '/'))
+        if not nombre.lower().endswith(EXTENSIONES_SUBIDA):
+            logger.warning("Archivo ignorado en la subida: %s", nombre or '(sin nombre)')
+            return None
+        # El prefijo numérico evita colisiones entre partes con el mismo nombre
+        return os.path.join(self.spool_dir, f"{self.archivos_recibidos:04d}_{nombre}")
+
+    def _submit(self, pool: ThreadPoolExecutor, pending: threading.Semaphore, path: str) -> Future:
+        # Encola la extracción de una parte; bloquea la lectura mientras la cola esté llena
+        pending.acquire()
+        # Los hilos del pool no heredan el contexto: se copia para conservar el ID del trabajo en los registros
+        contexto = contextvars.copy_context()
+        if path.lower().endswith('.pdf'):
+            future = pool.submit(contexto.run, self._process_pdf, path)
+        else:
+            future = pool.submit(contexto.run, self._process_archive, path)
+        future.add_done_callback(lambda _: pending.release())
+        return future
+
+    def _process_pdf(self, pdf_path: str) -> List[DocumentoData]:
+        # Extrae los datos de un PDF con el mismo flujo que /procesar
+        pdf_filename = os.path.basename(pdf_path)
+        if os.path.dirname(pdf_path) == self.spool_dir:
+            pdf_filename = pdf_filename.split('_', 1)[1]
+        try:
+            text = self.triage.extract_candidate_text(pdf_path, self.extractor)
+            if text is None:
+                return []
+            doc_data = self.extractor.extract_document_data(text, pdf_filename)
+            return [doc_data] if doc_data else []
+        except Exception as e:
+            logger.error("Error procesando %s: %s", pdf_filename, e, extra={"file": pdf_filename, "stage": "extraccion_texto"})
+            return []
+
+    def _process_archive(self, archive_path: str) -> List[DocumentoData]:
+        # Extrae el ZIP/RAR ya completo y procesa cada PDF que contiene
+        file_processor = FileProcessor(self.workspace.temp_root)
+        try:
+            carpeta_trabajo = file_processor.extract_compressed_file(archive_path)
+            documentos = []
+            for pdf in file_processor.find_pdf_files(carpeta_trabajo):
+                documentos.extend(self._process_pdf(pdf))
+            return documentos
+        except Exception as e:
+            logger.error("Error procesando archivo subido %s: %s", os.path.basename(archive_path), e, extra={"file": os.path.basename(archive_path), "stage": "descompresion"})
+            return []
+        finally:
+            file_processor.cleanup_temp_files()
+            # El comprimido ya no es necesario: libera el espacio en disco cuanto antes
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
@@ -3,20 +3,33 @@ from flask_cors import CORS
 from ExtraerData.Normal.archivos import FileProcessor
 from ExtraerData.Normal.extractor import DocumentExtractor
 from ExtraerData.Normal.excel import ExcelExporter
-from ExtraerData.Masivo.procesadorMasivo import MassiveProcessor  
-from ExtraerData.Normal.configuracion import logger
+from ExtraerData.Normal.subida import UploadProcessor, UploadTooLargeError
+from ExtraerData.Normal.almacen import DocumentStore
+from ExtraerData.Normal.prefiltro import PdfTriage
+from ExtraerData.Normal.espacio import JobWorkspace
+from ExtraerData.Masivo.ProcesadorMasivo import MassiveProcessor
+from ExtraerData.Masivo.PlanificadorTrabajos import JobScheduler, DuplicateJobError
+from ExtraerData.Normal.configuracion import logger, trabajo_actual, MAX_CONCURRENT_UPLOADS, DB_QUERY_LIMIT, DRY_RUN_SAMPLE_SIZE
 import os,threading
 
 # Configuración inicial de la aplicación Flask con soporte CORS
 app = Flask(__name__)
 CORS(app)  # Habilita CORS para permitir peticiones desde diferentes dominios
 
-# Diccionario global para almacenar el estado de progreso de cada procesamiento masivo
-massive_processing_status = {}
+# Almacén SQLite donde se registran todos los documentos extraídos
+document_store = DocumentStore()
+
+# Planificador global que encola los procesamientos masivos y guarda su estado de progreso
+job_scheduler = JobScheduler(processor_factory=lambda: MassiveProcessor(document_store))
+
+# Limita las subidas simultáneas para acotar el uso de disco y CPU del servidor
+upload_slots = threading.BoundedSemaphore(MAX_CONCURRENT_UPLOADS)
 
 @app.route("/procesar", methods=["POST"])
 def procesar_archivos():
     # Endpoint para procesamiento individual de archivos o carpetas con documentos PDF
+    workspace = None
+    contexto = None
     try:
         data = request.get_json()
         ruta = data.get("ruta")
@@ -25,10 +38,13 @@ def procesar_archivos():
         if not ruta or not os.path.exists(ruta):
             return jsonify({"error": "La ruta proporcionada no existe"}), 400
 
-        # Inicializa los componentes necesarios para el procesamiento
-        file_processor = FileProcessor()
+        # Inicializa los componentes necesarios para el procesamiento dentro de un espacio de trabajo propio
+        workspace = JobWorkspace("procesar")
+        contexto = trabajo_actual.set(workspace.id)
+        file_processor = FileProcessor(workspace.temp_root)
         extractor = DocumentExtractor()
         excel_exporter = ExcelExporter()
+        triage = PdfTriage()
 
         # Maneja diferentes tipos de entrada: archivos comprimidos o carpetas
         if os.path.isfile(ruta) and ruta.lower().endswith((".zip", ".rar")):
@@ -44,39 +60,96 @@ def procesar_archivos():
         if not pdf_files:
             return jsonify({"error": "No se encontraron archivos PDF"}), 400
 
-        # Procesa cada PDF encontrado extrayendo su texto y datos estructurados
+        # Procesa cada PDF extrayendo su texto y datos estructurados; el prefiltro descarta con un sondeo
+        # rápido los que no parecen certificados CC/TI/PPT/CE y los candidatos reutilizan el PDF ya abierto
         documentos_extraidos = []
         for pdf in pdf_files:
             try:
-                text = extractor.extract_text_from_pdf(pdf)
+                text = triage.extract_candidate_text(pdf, extractor)
+                if text is None:
+                    continue
                 doc_data = extractor.extract_document_data(text, os.path.basename(pdf))
                 if doc_data:
                     documentos_extraidos.append(doc_data)
             except Exception as e:
-                logger.error(f"Error procesando {pdf}: {e}")
+                logger.error("Error procesando %s: %s", pdf, e, extra={"file": os.path.basename(pdf), "stage": "extraccion_texto"})
+
+        if triage.resumen()["descartados"] == len(pdf_files):
+            return jsonify({"error": "Ningún PDF parece ser un certificado de documento", "archivos_descartados": triage.resumen()}), 400
 
         if not documentos_extraidos:
             return jsonify({"error": "No se pudo extraer información de los PDFs"}), 400
 
-        # Exporta los datos extraídos a un archivo Excel
-        excel_path = excel_exporter.export_to_excel(documentos_extraidos, ficha)
+        # Exporta los datos extraídos a un archivo Excel y los registra en el almacén
+        excel_path = excel_exporter.export_to_excel(documentos_extraidos, ficha, workspace)
+        guardar_en_almacen(documentos_extraidos, ficha, ruta)
+
+        return jsonify({"message": "Proceso completado con éxito", "excel_path": excel_path, "documentos_procesados": len(documentos_extraidos), "archivos_descartados": triage.resumen()})
 
-        # Limpia archivos temporales si se extrajeron de archivos comprimidos
-        file_processor.cleanup_temp_files()
+    except Exception as e:
+        logger.error("Error en /procesar: %s", e)
+        return jsonify({"error": str(e)}), 500
+    finally:
+        # Limpia el espacio de trabajo (incluidos los archivos extraídos de comprimidos) en cualquier caso
+        if workspace:
+            workspace.cleanup()
+        if contexto:
+            trabajo_actual.reset(contexto)
 
-        return jsonify({"message": "Proceso completado con éxito", "excel_path": excel_path, "documentos_procesados": len(documentos_extraidos)})
+@app.route("/procesar-subida", methods=["POST"])
+def procesar_subida():
+    # Endpoint que recibe PDFs, ZIPs o RARs por multipart y los procesa mientras se suben
+    if not upload_slots.acquire(blocking=False):
+        return jsonify({"error": "El servidor está procesando demasiadas subidas, intente más tarde"}), 503
+
+    workspace = None
+    contexto = None
+    try:
+        # Se crean dentro del try para que un fallo al prepararlos también libere el cupo de subida
+        workspace = JobWorkspace("subida")
+        contexto = trabajo_actual.set(workspace.id)
+        upload_processor = UploadProcessor(workspace)
+        documentos_extraidos = upload_processor.process_upload(request.stream, request.headers.get("Content-Type"), request.content_length)
 
+        if not upload_processor.archivos_recibidos:
+            return jsonify({"error": "No se recibieron archivos PDF, ZIP o RAR"}), 400
+
+        if not documentos_extraidos:
+            return jsonify({"error": "No se pudo extraer información de los PDFs", "archivos_descartados": upload_processor.triage.resumen()}), 400
+
+        # La ficha puede llegar como campo del formulario o como parámetro de la URL
+        ficha = upload_processor.fields.get("ficha") or request.args.get("ficha", "default")
+        excel_path = ExcelExporter().export_to_excel(documentos_extraidos, ficha, workspace)
+        guardar_en_almacen(documentos_extraidos, ficha)
+
+        return jsonify({"message": "Proceso completado con éxito", "excel_path": excel_path, "documentos_procesados": len(documentos_extraidos), "archivos_descartados": upload_processor.triage.resumen()})
+
+    except UploadTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        logger.error(f"Error en /procesar: {e}")
+        logger.error("Error en /procesar-subida: %s", e)
         return jsonify({"error": str(e)}), 500
+    finally:
+        if workspace:
+            workspace.cleanup()
+        if contexto:
+            trabajo_actual.reset(contexto)
+        upload_slots.release()
 
 @app.route("/procesar-masivo", methods=["POST"])
 def procesar_masivo():
-    # Endpoint para iniciar procesamiento masivo de múltiples carpetas/archivos ZIP
+    # Endpoint para encolar un procesamiento masivo de múltiples carpetas/archivos ZIP
     try:
         data = request.get_json()
         ruta = data.get("ruta")
         process_id = data.get("process_id", "default_massive_process")
+        priority = data.get("priority", 0)
+        dry_run = bool(data.get("dry_run", False))
+        sample_size = data.get("muestra", DRY_RUN_SAMPLE_SIZE)
+        # workers no cambia la ejecución: solo agrega a la estimación una proyección hipotética en paralelo
+        workers = data.get("workers", 1)
 
         if not ruta or not os.path.exists(ruta):
             return jsonify({"error": "La ruta proporcionada no existe"}), 400
@@ -84,78 +157,108 @@ def procesar_masivo():
         if not os.path.isdir(ruta):
             return jsonify({"error": "La ruta debe ser una carpeta para procesamiento masivo"}), 400
 
-        # Inicializa el estado del procesamiento en el diccionario global
-        massive_processing_status[process_id] = {"status": "processing", "progress": 0, "message": "Iniciando procesamiento...", "result": None, "error": None}
+        if not isinstance(priority, int):
+            return jsonify({"error": "La prioridad debe ser un número entero"}), 400
+
+        if not isinstance(sample_size, int) or sample_size < 1 or not isinstance(workers, int) or workers < 1:
+            return jsonify({"error": "La muestra y los workers deben ser enteros mayores que cero"}), 400
 
-        # Ejecuta el procesamiento en un hilo separado para no bloquear la aplicación
-        thread = threading.Thread(
-            target=run_massive_processing,
-            args=(ruta, process_id)
-        )
-        thread.daemon = True
-        thread.start()
+        # El planificador limita los procesamientos simultáneos; el resto espera en cola
+        # Con dry_run solo se estima el costo del procesamiento a partir de una muestra de PDFs
+        status_data = job_scheduler.submit(process_id, ruta, priority, dry_run, sample_size, workers)
 
-        return jsonify({ "message": "Procesamiento masivo iniciado", "process_id": process_id, "status_url": f"/procesar-masivo/status/{process_id}"})
+        mensaje = "Estimación de procesamiento masivo encolada" if dry_run else "Procesamiento masivo encolado"
+        return jsonify({ "message": mensaje, "process_id": process_id, "dry_run": dry_run, "queue_position": status_data["queue_position"], "status_url": f"/procesar-masivo/status/{process_id}"})
 
+    except DuplicateJobError as e:
+        return jsonify({"error": str(e)}), 409
     except Exception as e:
-        logger.error(f"Error iniciando procesamiento masivo: {e}")
+        logger.error("Error iniciando procesamiento masivo: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route("/procesar-masivo/status/<process_id>", methods=["GET"])
 def get_massive_status(process_id):
-    # Endpoint para consultar el estado actual de un procesamiento masivo en curso
-    if process_id not in massive_processing_status:
+    # Endpoint para consultar el estado actual de un procesamiento masivo en cola o en curso
+    status_data = job_scheduler.get_status(process_id)
+    if status_data is None:
         return jsonify({"error": "ID de proceso no encontrado"}), 404
 
-    status_data = massive_processing_status[process_id]
     return jsonify(status_data)
 
 @app.route("/procesar-masivo/result/<process_id>", methods=["GET"])
 def get_massive_result(process_id):
     # Endpoint para obtener el resultado final de un procesamiento masivo completado
-    if process_id not in massive_processing_status:
+    status_data = job_scheduler.get_status(process_id)
+    if status_data is None:
         return jsonify({"error": "ID de proceso no encontrado"}), 404
-
-    status_data = massive_processing_status[process_id]
     
     if status_data["status"] == "completed" and status_data["result"]:
         return jsonify({"status": "completed","result": status_data["result"]})
     elif status_data["status"] == "error":
         return jsonify({"status": "error", "error": status_data["error"]})
+    elif status_data["status"] == "cancelled":
+        return jsonify({"status": "cancelled", "message": "El procesamiento fue cancelado"})
     else:
-        return jsonify({"status": "processing", "message": "El procesamiento aún está en curso"})
+        return jsonify({"status": status_data["status"], "message": "El procesamiento aún está en curso"})
 
-def run_massive_processing(ruta, process_id):
-    # Función que ejecuta el procesamiento masivo en un hilo separado
+@app.route("/procesar-masivo/<process_id>", methods=["DELETE"])
+def cancel_massive(process_id):
+    # Endpoint para cancelar un procesamiento masivo en cola o detenerlo entre documentos si ya inició
+    status_data = job_scheduler.cancel(process_id)
+    if status_data is None:
+        return jsonify({"error": "ID de proceso no encontrado"}), 404
+
+    if status_data["status"] not in ("queued", "processing", "cancelled"):
+        return jsonify({"error": "El procesamiento ya finalizó", "status": status_data["status"]}), 409
+
+    return jsonify({"message": "Cancelación solicitada", "process_id": process_id, "status": status_data["status"]})
+
+@app.route("/documentos/<numero_documento>", methods=["GET"])
+def buscar_documento(numero_documento):
+    # Endpoint para saber si un número de documento ya fue procesado y en qué fichas/archivos
+    registros = document_store.find_by_number(numero_documento, request.args.get("tipo"))
+    return jsonify({"numero_documento": numero_documento, "procesado": bool(registros), "registros": registros})
+
+@app.route("/documentos", methods=["GET"])
+def buscar_documentos():
+    # Endpoint de búsqueda por prefijo del número (?prefijo=) o por nombre (?nombre=, con ?contiene=1 para buscar en cualquier parte)
     try:
-        processor = MassiveProcessor()
-        
-        # Callbacks para actualizar el progreso y estado durante el procesamiento
-        def progress_callback(progress):
-            massive_processing_status[process_id]["progress"] = progress
-        
-        def status_callback(message):
-            massive_processing_status[process_id]["message"] = message
-            massive_processing_status[process_id]["progress"] = massive_processing_status[process_id].get("progress", 0)
-        
-        # Ejecuta el procesamiento masivo principal
-        zip_path = processor.process_massive(ruta, progress_callback, status_callback)
-        
-        # Actualiza el estado final según el resultado del procesamiento
-        if zip_path:
-            massive_processing_status[process_id] = {"status": "completed", "progress": 100, "message": "Procesamiento masivo completado exitosamente",
-                "result": {
-                    "zip_path": zip_path,
-                    "message": "Todos los archivos han sido procesados y comprimidos"
-                },
-                "error": None
-            }
-        else:
-            massive_processing_status[process_id] = {"status": "error","progress": 0,"message": "No se generaron resultados","result": None, "error": "No se encontraron archivos para procesar o ocurrió un error"}
-            
+        limit = leer_limite()
+    except ValueError:
+        return jsonify({"error": "El límite debe ser un número entero"}), 400
+
+    prefijo = request.args.get("prefijo")
+    nombre = request.args.get("nombre")
+    if prefijo:
+        registros = document_store.search_by_prefix(prefijo, limit)
+    elif nombre:
+        registros = document_store.search_by_name(nombre, request.args.get("contiene") in ("1", "true"), limit)
+    else:
+        return jsonify({"error": "Debe indicar el parámetro prefijo o nombre"}), 400
+
+    return jsonify({"total": len(registros), "registros": registros})
+
+@app.route("/documentos/duplicados", methods=["GET"])
+def buscar_duplicados():
+    # Endpoint que lista los documentos registrados en más de una ficha
+    try:
+        limit = leer_limite()
+    except ValueError:
+        return jsonify({"error": "El límite debe ser un número entero"}), 400
+
+    duplicados = document_store.find_duplicates(limit)
+    return jsonify({"total": len(duplicados), "duplicados": duplicados})
+
+def leer_limite():
+    # Lee ?limit= y lo acota a 1..DB_QUERY_LIMIT; un valor negativo llegaría a SQLite como "sin límite"
+    return min(max(int(request.args.get("limit", DB_QUERY_LIMIT)), 1), DB_QUERY_LIMIT)
+
+def guardar_en_almacen(documentos, ficha, fuente=None):
+    # Registra los documentos en el almacén sin interrumpir la respuesta si falla
+    try:
+        document_store.save_documents(documentos, ficha, fuente)
     except Exception as e:
-        logger.error(f"Error en procesamiento masivo: {e}")
-        massive_processing_status[process_id] = {"status": "error","progress": 0,"message": "Error durante el procesamiento","result": None,"error": str(e)}
+        logger.error("Error guardando documentos en el almacén: %s", e, extra={"stage": "almacen"})
 
 if __name__ == "__main__":
     # Inicia el servidor Flask en modo debug
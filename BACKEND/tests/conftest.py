@@ -0,0 +1,25 @@
+import logging, os, sys, tempfile, time
+import pytest
+
+# Las pruebas importan los módulos igual que app.py, con BACKEND como raíz
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# El registro se abre al importar configuracion: se redirige a un directorio temporal antes de importar
+# ExtraerData para no escribir en el pdf_extractor.log del repositorio
+os.environ.setdefault('PDF_EXTRACTOR_LOG_FILE', os.path.join(tempfile.mkdtemp(prefix="pdf_extractor_pruebas_"), 'pdf_extractor.log'))
+
+from ExtraerData.Normal.configuracion import LimiteErroresFilter
+
+
+@pytest.fixture(scope="session", autouse=True)
+def vaciar_registros():
+    # Envía los resúmenes de errores limitados antes de que pytest cierre la salida capturada;
+    # si se dejaran para atexit, el manejador de consola escribiría sobre un stream ya cerrado
+    yield
+    for handler in logging.getLogger().handlers:
+        for filtro in handler.filters:
+            if isinstance(filtro, LimiteErroresFilter):
+                filtro.vaciar(todo=True)
+        cola = getattr(handler, 'queue', None)
+        while cola is not None and not cola.empty():
+            time.sleep(0.01)
@@ -0,0 +1,20 @@
+from ExtraerData.Normal.almacen import DocumentStore
+from ExtraerData.Normal.modelos import DocumentoData
+
+
+def documento(numero, archivo="a.pdf"):
+    return DocumentoData(tipo_documento='CC', numero_documento=numero, nombres_apellidos='ANA GOMEZ', dia='1', mes='Enero',
+                         año='2000', fecha_vigencia=None, dias_restantes="N/A", estado='EXTRAÍDO', archivo_origen=archivo)
+
+
+def test_duplicados_conserva_fichas_con_comas(tmp_path):
+    store = DocumentStore(str(tmp_path / "documentos.db"))
+    store.save_documents([documento("1000")], "Pérez, Juan")
+    store.save_documents([documento("1000")], "Lote 2")
+    store.save_documents([documento("2000")], "Lote 2")
+
+    duplicados = store.find_duplicates()
+
+    assert len(duplicados) == 1
+    assert duplicados[0]["numero_documento"] == "1000"
+    assert sorted(duplicados[0]["fichas"]) == ["Lote 2", "Pérez, Juan"]
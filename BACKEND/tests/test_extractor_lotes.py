@@ -0,0 +1,77 @@
+import logging, random
+import pytest
+from ExtraerData.Normal.extractor import DocumentExtractor
+
+# Fragmentos de certificados reales y casos límite (fechas inválidas, nombres en varias líneas)
+FRAGMENTOS = [
+    'Cédula de Ciudadanía: 1.023.456\n',
+    'Fecha de Expedición: 3 DE MARZO DE 2010\n',
+    'válida en todo el territorio nacional hasta el 1 de Enero de 2030\n',
+    'válida en todo el territorio nacional hasta el 31 de febrero de 2030\n',
+    'A nombre de: JUAN PÉREZ\n',
+    'Número Único de Identificación Personal 1000222\n',
+    'el 4 DE JULIO DE 2015 ',
+    'certifica que una vez consultado el sistema, MARIA   LOPEZ\nGOMEZ tiene inscrito',
+    'PPT número: 445566\n',
+    'RUMV 9988 ',
+    'a los 9 días del mes de agosto de 2022',
+    'el migrante venezolano CARLOS RUIZ surtió',
+    'Cédula de Extranjería: 556677\n',
+    'Fecha de Expedición: 2020/13/02\n',
+    'Fecha de Expedición: 2020/05/02\n',
+    'Nombres y Apellidos ANA MARIA\nFecha de Nacimiento',
+    'Permiso Por Protección Temporal ',
+    'texto de relleno sin datos\n',
+    '',
+]
+
+
+def generar_documentos(cantidad, semilla):
+    # Construye textos aleatorios combinando fragmentos, con nombres de archivo únicos
+    aleatorio = random.Random(semilla)
+    return [(''.join(aleatorio.choices(FRAGMENTOS, k=aleatorio.randint(1, 8))), f"doc_{i}.pdf") for i in range(cantidad)]
+
+
+def extraer_individual(extractor, documentos):
+    resultados = [extractor.extract_document_data(texto, archivo) for texto, archivo in documentos]
+    return [documento for documento in resultados if documento]
+
+
+@pytest.mark.parametrize("semilla", [1, 2, 3])
+def test_lote_equivale_a_extraccion_individual(semilla):
+    extractor = DocumentExtractor()
+    documentos = generar_documentos(2000, semilla)
+
+    lote = extractor.batch_to_documentos(extractor.extract_documents_batch(documentos))
+
+    assert lote == extraer_individual(extractor, documentos)
+
+
+def test_lote_vacio():
+    extractor = DocumentExtractor()
+    assert extractor.batch_to_documentos(extractor.extract_documents_batch([])) == []
+
+
+def test_fallo_del_lote_se_resuelve_por_documento(monkeypatch):
+    extractor = DocumentExtractor()
+    documentos = generar_documentos(500, 4)
+
+    def fallar(*args):
+        raise RuntimeError("fallo simulado")
+    monkeypatch.setattr(extractor, "_extract_batch_cc", fallar)
+
+    lote = extractor.batch_to_documentos(extractor.extract_documents_batch(documentos))
+
+    assert lote == extraer_individual(extractor, documentos)
+    assert any(documento.tipo_documento == 'CC' for documento in lote)
+
+
+def test_error_de_fecha_cc_registra_el_archivo(caplog):
+    extractor = DocumentExtractor()
+    texto = FRAGMENTOS[0] + FRAGMENTOS[1] + FRAGMENTOS[3]
+
+    with caplog.at_level(logging.ERROR):
+        resultado = extractor.extract_documents_batch([(texto, "vencida.pdf")])
+
+    assert resultado.empty
+    assert [getattr(registro, 'file', None) for registro in caplog.records] == ["vencida.pdf"]
@@ -140,7 +140,8 @@ export default function InfoModalMasivo({ isOpen, onClose }) {
                 <FaDownload className="masivo-resultIcon" />
                 <div>
                   <strong>Archivo ZIP Consolidado:</strong> Todos los Excel generados se comprimen en un único archivo 
-                  llamado <code>excel_con_resultados.zip</code> que se guarda en la carpeta principal seleccionada.
+                  llamado <code>excel_con_resultados_[id].zip</code> que se guarda en la carpeta principal seleccionada; 
+                  el ID distingue cada procesamiento para que no se sobrescriban entre sí.
                 </div>
               </div>
               <div className="masivo-resultItem">
@@ -170,7 +171,7 @@ export default function InfoModalMasivo({ isOpen, onClose }) {
               <li>Selecciona la <strong>carpeta principal</strong> que contiene todas las subcarpetas y/o archivos ZIP</li>
               <li>Haz clic en <strong>"Iniciar Procesamiento"</strong></li>
               <li>El sistema escaneará automáticamente todos los elementos procesables</li>
-              <li>Al finalizar, busca el archivo <code>excel_con_resultados.zip</code> en la carpeta principal</li>
+              <li>Al finalizar, busca el archivo <code>excel_con_resultados_[id].zip</code> en la carpeta principal</li>
               <li>Extrae el ZIP para acceder a todos los archivos Excel generados</li>
             </ol>
           </div>
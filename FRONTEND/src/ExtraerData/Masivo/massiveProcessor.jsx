@@ -123,7 +123,9 @@ function MassiveProcessor() {
             Swal.fire({
               icon: "success",
               title: "Procesamiento completado",
-              text: "Los resultados se guardan en la misma carpeta seleccionada.",
+              text: resultData.result?.zip_path
+                ? `Los resultados se guardaron en: ${resultData.result.zip_path}`
+                : "Los resultados se guardan en la misma carpeta seleccionada.",
               confirmButtonColor: "#7c3aed",
               customClass: {
                 popup: "custom-swal",
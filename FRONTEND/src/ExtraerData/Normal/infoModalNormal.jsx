@@ -133,7 +133,7 @@ export default function InfoModalNormal({ isOpen, onClose }) {
               <li>Haz clic en <strong>"Iniciar Procesamiento"</strong></li>
               <li>El sistema buscará y procesará todos los PDFs encontrados</li>
               <li>Los resultados se guardarán automáticamente en tu carpeta de <strong>Descargas</strong></li>
-              <li>Busca el archivo: <code>plantilla_[ficha].xlsx</code></li>
+              <li>Busca el archivo: <code>plantilla_[ficha]_[id].xlsx</code>, donde el ID distingue cada procesamiento</li>
             </ol>
           </div>
 
@@ -78,7 +78,7 @@ function NormalProcessor() {
       Swal.fire({
         icon: "success",
         title: "Procesamiento completado",
-        text: "Los resultados se guardan en descargas del dispositivo.",
+        text: `Los resultados se guardaron en: ${data.excel_path}`,
         confirmButtonColor: "#16a34a",
         customClass: {
           popup: "custom-swal",